@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# Requests and wall time needed to call Incident.dict() on every open incident.
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.synthetic import SyntheticPager, make_incident
+from lib.pagerduty import Pagerduty
+
+COUNT = 200
+LATENCY = 0.01
+
+
+def run(name, incident_key, with_alerts):
+    pd = Pagerduty("synthetic", "synthetic@example.com")
+    pd.pager = SyntheticPager([make_incident(n, incident_key=incident_key) for n in range(1, COUNT + 1)], latency=LATENCY)
+
+    start = time.perf_counter()
+    for incident in pd.incidents(with_alerts=with_alerts):
+        incident.dict()
+    elapsed = time.perf_counter() - start
+
+    print("{:<40} {:>6} requests {:>8.2f}s".format(name, pd.pager.requests, elapsed))
+
+
+if __name__ == '__main__':
+    print("{} incidents, {}ms per request".format(COUNT, int(LATENCY * 1000)))
+    run("lazy alerts, no incident_key", False, False)
+    run("prefetched alerts, no incident_key", False, True)
+    run("incident_key from listing", True, False)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# Classifying many distinct titles against many rules.
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib.classify import Classifier, DEFAULT_RULES
+
+RULES = 500
+TITLES = 10000
+
+
+def timed(name, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print("{:<30} {:>8.3f}s {:>8.1f}us/title".format(name, elapsed, elapsed / TITLES * 1e6))
+
+
+if __name__ == '__main__':
+    rules = [
+        {"class": "check {}".format(n), "template": "Check {} failed on {{host}}".format(n), "summary": "check {}: {{host}}".format(n)}
+        for n in range(RULES)
+    ] + DEFAULT_RULES
+    titles = ["Check {} failed on host-{}".format(n % (RULES * 2), n) for n in range(TITLES)]
+
+    print("{} rules, {} distinct titles".format(len(rules), len(titles)))
+    for count in [len(DEFAULT_RULES), len(rules)]:
+        classifier = Classifier(rules[-count:])
+        timed("{} rules".format(count), lambda: [classifier.classify(title) for title in titles])
+
+    regex_rules = [
+        {"class": "check {}".format(n), "regex": r"Check {} failed on (?P<host>\S+)$".format(n), "summary": "check {}: {{host}}".format(n)}
+        for n in range(RULES)
+    ] + DEFAULT_RULES
+    for count in [len(DEFAULT_RULES), len(regex_rules)]:
+        classifier = Classifier(regex_rules[-count:])
+        timed("{} rules, regexes".format(count), lambda: [classifier.classify(title) for title in titles])
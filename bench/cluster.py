@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Clustering tens of thousands of distinct unclassified titles, as pd summary -s --cluster does.
+import random
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib.cluster import Clusterer
+
+TEMPLATES = [
+    "Disk usage above {pct}% on {host}",
+    "CPU load {load} on {host} for {minutes} minutes",
+    "Health check failed for {service} on {ip}:{port}",
+    "Job {service} run {uuid} failed at {time}",
+    "{host} is not responding to ping",
+    "Certificate for {service}.example.com expires in {days} days",
+    "Replication lag {seconds}s on {host} (shard {shard})",
+    "Error rate {pct}% for {service} in {region}",
+    "Instance i-{hex} in {region} failed status checks",
+    "Queue {service}-jobs has {count} messages",
+]
+SERVICES = ["billing", "search", "auth", "checkout", "images", "email", "reports", "api", "web", "cron"]
+REGIONS = ["us-east-1", "us-west-2", "eu-west-1"]
+# words that don't contain numbers, so only the clustering can tell they don't matter
+HOSTS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot"]
+
+
+def make_title(random):
+    return random.choice(TEMPLATES).format(
+        pct = random.randrange(80, 100),
+        host = random.choice(["web-{}.prod".format(random.randrange(500)), "db{}".format(random.randrange(50)), random.choice(HOSTS)]),
+        load = round(random.uniform(4, 40), 2),
+        minutes = random.randrange(5, 60),
+        service = random.choice(SERVICES),
+        ip = "10.{}.{}.{}".format(random.randrange(256), random.randrange(256), random.randrange(256)),
+        port = random.randrange(1024, 65536),
+        uuid = "{:08x}-{:04x}-{:04x}-{:04x}-{:012x}".format(*(random.getrandbits(n) for n in [32, 16, 16, 16, 48])),
+        time = "2019-02-{:02d}T{:02d}:{:02d}:00Z".format(random.randrange(1, 29), random.randrange(24), random.randrange(60)),
+        days = random.randrange(1, 30),
+        seconds = random.randrange(30, 3000),
+        shard = random.randrange(16),
+        region = random.choice(REGIONS),
+        hex = "{:017x}".format(random.getrandbits(68)),
+        count = random.randrange(1000, 100000),
+    )
+
+
+def make_distinct_title(random, words):
+    """A title sharing few words with any other, so nearly every one starts a template."""
+    return " ".join(random.choice(words) for _ in range(random.randrange(4, 9)))
+
+
+def run(label, titles):
+    clusterer = Clusterer()
+
+    start = time.perf_counter()
+    clusters = [clusterer.add(title) for title in titles]
+    names = set(cluster.name for cluster in clusters)
+    elapsed = time.perf_counter() - start
+
+    print("{:>6} {} titles ({:>6} distinct) {:>6} clusters {:>8.3f}s {:>6.1f}us/title".format(
+        len(titles), label, len(set(titles)), len(names), elapsed, elapsed / len(titles) * 1e6,
+    ))
+    return names
+
+
+if __name__ == '__main__':
+    rng = random.Random(0)
+    for count in [1000, 10000, 50000]:
+        names = run("alert", [make_title(rng) for _ in range(count)])
+
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randrange(3, 9))) for _ in range(5000)]
+    for count in [1000, 10000, 50000]:
+        run("unrelated", [make_distinct_title(rng, words) for _ in range(count)])
+
+    for name in sorted(names):
+        print("    " + name)
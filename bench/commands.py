@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Runs pd subcommands end to end against bench/server.py and reports how long
+# each took, how many requests it made and how much data came back.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.server import Data, MockServer
+
+COMMANDS = [
+    ["summary"],
+    ["summary", "-s"],
+    ["summary", "--all"],
+    ["who"],
+    ["show", "1", "2", "3", "4", "5"],
+    ["ack", "1", "2", "4", "5", "7", "8"],
+    ["snooze", "1", "2", "3", "4", "5", "6", "7", "8", "9", "10"],
+    ["resolve", "1", "2", "3", "4", "5", "6", "7", "8", "9", "10"],
+    ["ackall"],
+    ["assign", "3", "user1@example.com"],
+]
+
+
+def run(server, home, incidents, command):
+    server.data = Data(incidents=incidents)
+    server.stats.reset()
+
+    env = dict(os.environ, HOME=home)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, str(ROOT / "pd")] + command,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    if result.returncode not in [0, 1]:
+        print(result.stderr, file=sys.stderr)
+
+    return elapsed, result.returncode
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark pd commands against a local fake pagerduty")
+    parser.add_argument("--incidents", type=int, default=500, help="number of open incidents to serve")
+    parser.add_argument("--latency", type=int, default=20, help="milliseconds added to every request")
+    parser.add_argument("--connect-latency", type=int, default=30, help="milliseconds added to every new connection")
+    parser.add_argument("--verbose", "-v", action="store_true", help="show requests per endpoint")
+    parser.add_argument("command", nargs="*", help="only run commands starting with these words")
+    args = parser.parse_args()
+
+    server = MockServer(
+        Data(incidents=args.incidents),
+        latency=args.latency / 1000,
+        connect_latency=args.connect_latency / 1000,
+    ).start()
+
+    with tempfile.TemporaryDirectory() as home:
+        config = Path(home) / ".config" / "pd.json"
+        config.parent.mkdir()
+        config.write_text(json.dumps({
+            "api_key": "bench",
+            "email": server.data.me["email"],
+            "api_base": server.api_base,
+        }))
+
+        print("{} incidents, {}ms latency per request, {}ms per connection\n".format(
+            args.incidents, args.latency, args.connect_latency,
+        ))
+        print("{:<40} {:>8} {:>9} {:>11}".format("command", "wall", "requests", "bytes"))
+        for command in COMMANDS:
+            if args.command and command[:len(args.command)] != args.command:
+                continue
+
+            elapsed, code = run(server, home, args.incidents, command)
+            print("{:<40} {:>7.2f}s {:>9} {:>11}{}".format(
+                " ".join(command),
+                elapsed,
+                server.stats.requests,
+                server.stats.bytes_out,
+                "" if code in [0, 1] else "  (exit {})".format(code),
+            ))
+            if args.verbose:
+                for endpoint, count in sorted(server.stats.endpoints.items()):
+                    print("    {:<36} {:>9}".format(endpoint, count))
+
+    server.shutdown()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# CPU cost of building Incident objects and reading their dates.
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import maya
+import pygerduty.v2
+import tzlocal
+
+from bench.synthetic import make_incident
+from lib.pagerduty import Pagerduty, Incident
+
+COUNT = 10000
+
+
+def timed(name, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print("{:<40} {:>8.3f}s {:>8.1f}us/incident".format(name, elapsed, elapsed / COUNT * 1e6))
+
+
+if __name__ == '__main__':
+    pd = Pagerduty("synthetic", "synthetic@example.com")
+    collection = pd.pager.incidents
+    raws = [pygerduty.v2.Incident(collection, **make_incident(n)) for n in range(1, COUNT + 1)]
+
+    incidents = []
+    timed("construct", lambda: incidents.extend(Incident(pd, raw) for raw in raws))
+    timed("read date", lambda: [incident.date for incident in incidents])
+    timed("maya parse (old per-incident cost)", lambda: [
+        maya.parse(raw.created_at).datetime(to_timezone=str(tzlocal.get_localzone())).strftime("%Y-%m-%d")
+        for raw in raws
+    ])
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Memory held by a large set of incidents and alerts: the pygerduty containers
+# Incident and Alert used to keep hold of, against what they keep now.
+import copy
+import sys
+import time
+import tracemalloc
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pygerduty.v2
+
+from bench.synthetic import make_alert, make_incident
+from lib.pagerduty import Alert, Incident, Pagerduty
+
+COUNT = 50000
+
+
+def measure(name, func, payloads):
+    # the api's dicts are fresh for every run, and not counted
+    fresh = copy.deepcopy(payloads)
+    start = time.perf_counter()
+    func(fresh)
+    elapsed = time.perf_counter() - start
+
+    payloads = copy.deepcopy(payloads)
+    tracemalloc.start()
+    kept = func(payloads)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:<32} {:>8.1f}MB {:>8.0f} bytes/item {:>8.3f}s".format(name, size / 1e6, size / len(kept), elapsed))
+    return kept
+
+
+if __name__ == '__main__':
+    pd = Pagerduty("synthetic", "synthetic@example.com")
+    incidents = [make_incident(n) for n in range(1, COUNT + 1)]
+    alerts = [make_alert(incident) for incident in incidents]
+    print("{} incidents and alerts\n".format(COUNT))
+
+    measure("incident containers", lambda data: [pygerduty.v2.Incident(pd.pager.incidents, **raw) for raw in data], incidents)
+    measure("Incident records", lambda data: [Incident(pd, raw) for raw in data], incidents)
+    measure("alert containers", lambda data: [pygerduty.v2.Alert(pd.pager.alerts, **raw) for raw in data], alerts)
+    measure("Alert records", lambda data: [Alert(raw) for raw in data], alerts)
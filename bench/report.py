@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# Time for pd report over a store of 100k synthetic incidents.
+import json
+import random
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.synthetic import make_incident
+from lib.classify import Classifier
+from lib.report import GROUPS, Report
+from lib.store import DERIVED, Store
+
+COUNT = 100000
+
+
+def title(number):
+    """Titles like real alerts', nearly all different."""
+    kind = number % 4
+    if kind == 0:
+        return "Plan does not match remote state for: repo-{} in Workspace: default".format(number % 500)
+    if kind == 1:
+        return "Disk usage {}% on db-{}".format(90 + number % 10, number)
+    return "Outdated running instance (host-{}-us-east-1{} - i-{:08x}) found in prod".format(number % 2000, "abcd"[number % 4], number * 7919)
+
+
+def fill(store):
+    random.seed(0)
+    start = datetime(2019, 1, 1, tzinfo=timezone.utc)
+
+    def stamp(when):
+        return when.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    rows = []
+    for number in range(1, COUNT + 1):
+        raw = make_incident(number, status="resolved")
+        raw["title"] = title(number)
+        created = start + timedelta(seconds=random.randrange(365 * 24 * 60 * 60))
+        acked = created + timedelta(seconds=random.randrange(3600)) if number % 4 else None
+        resolved = created + timedelta(seconds=random.randrange(86400))
+        rows.append((
+            raw["id"], number, "resolved", stamp(created), stamp(resolved), "PUSER1", json.dumps(raw),
+            raw["title"], raw["service"]["summary"], stamp(acked) if acked else None, stamp(resolved),
+        ))
+
+    store.db.executemany("INSERT INTO incidents (id, number, status, created_at, last_status_change_at, assignee_id, raw, title, service, acknowledged_at, resolved_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    store.db.execute("UPDATE incidents SET {}".format(DERIVED))
+    store.db.commit()
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Store(Path(tmp) / "bench.sqlite")
+        fill(store)
+
+        # once for a new store or new rules; pd sync does it as it saves otherwise
+        start = time.perf_counter()
+        store.classify(Classifier())
+        print("{:<24} {:>8.3f}s".format("classifying (once)", time.perf_counter() - start))
+
+        total = time.perf_counter()
+        report = Report(store, Classifier())
+        for group in [None] + GROUPS:
+            start = time.perf_counter()
+            rows = report.rows(group)
+            print("{:<24} {:>8.3f}s {:>6} rows".format("by " + (group or "nothing"), time.perf_counter() - start, len(rows)))
+
+        start = time.perf_counter()
+        report.hours()
+        print("{:<24} {:>8.3f}s".format("hour of week grid", time.perf_counter() - start))
+        print("{:<24} {:>8.3f}s".format("whole report", time.perf_counter() - total))
+        store.close()
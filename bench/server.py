@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# A stand-in for the parts of the PagerDuty REST v2 API that pd uses.
+#
+# Serves generated incidents, alerts, users, oncalls, schedules and escalation
+# policies from memory, with optional latency per request, and counts the
+# requests and bytes that go through it. Run it directly to poke at it by hand:
+#
+#     python bench/server.py --incidents 2000 --latency 50
+#
+# and set "api_base": "http://127.0.0.1:<port>/" in pd.json.
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.synthetic import make_alert, make_incident
+
+MAX_PAGE_SIZE = 100
+DAY = 24 * 60 * 60
+
+
+class Data():
+    def __init__(self, incidents=500, users=20, policies=10, levels=3, schedules=10):
+        self.users = [
+            {
+                "id": "PUSER{}".format(n),
+                "type": "user",
+                "name": "User {}".format(n),
+                "email": "user{}@example.com".format(n),
+                "summary": "User {}".format(n),
+            }
+            for n in range(users)
+        ]
+        self.me = self.users[0]
+
+        self.incidents = []
+        for n in range(1, incidents + 1):
+            incident = make_incident(n, status="triggered" if n % 3 else "acknowledged")
+            user = self.users[n % users]
+            incident["assignments"] = [{"assignee": {"id": user["id"], "type": "user_reference", "summary": user["summary"]}}]
+            self.incidents.append(incident)
+
+        self.policies = [
+            {"id": "PPOL{}".format(n), "type": "escalation_policy", "name": "Policy {}".format(n), "summary": "Policy {}".format(n)}
+            for n in range(policies)
+        ]
+
+        self.schedules = [
+            {
+                "id": "PSCHED{}".format(n),
+                "type": "schedule",
+                "name": "Schedule {}".format(n),
+                "summary": "Schedule {}".format(n),
+                "time_zone": "UTC",
+            }
+            for n in range(schedules)
+        ]
+
+        # shifts started a day ago and hand off in `level` days
+        now = time.time()
+        self.oncalls = []
+        for policy_number, policy in enumerate(self.policies):
+            for level in range(1, levels + 1):
+                user = self.users[(policy_number + level) % users]
+                schedule = self.schedules[policy_number % schedules]
+                self.oncalls.append({
+                    "escalation_policy": {"id": policy["id"], "type": "escalation_policy_reference", "summary": policy["summary"]},
+                    "escalation_level": level,
+                    "schedule": {"id": schedule["id"], "type": "schedule_reference", "summary": schedule["summary"]},
+                    "user": {"id": user["id"], "type": "user_reference", "summary": user["summary"]},
+                    "start": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - DAY)),
+                    "end": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now + level * DAY)),
+                })
+
+        self.overrides = []
+        self.log_entries = []
+
+    def log(self, incident, kind):
+        self.log_entries.append({
+            "id": "PLOG{}".format(len(self.log_entries)),
+            "type": "{}_log_entry".format(kind),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "incident": {"id": incident["id"], "type": "incident_reference"},
+        })
+
+    def trigger(self):
+        """Open a new incident, as if an alert had just come in."""
+        number = len(self.incidents) + 1
+        user = self.users[number % len(self.users)]
+        incident = make_incident(number)
+        incident["assignments"] = [{"assignee": {"id": user["id"], "type": "user_reference", "summary": user["summary"]}}]
+        self.incidents.append(incident)
+        self.log(incident, "trigger")
+        return incident
+
+    def incident(self, _id):
+        for incident in self.incidents:
+            if _id in [incident["id"], str(incident["incident_number"])]:
+                return incident
+        return None
+
+
+class Stats():
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.connections = 0
+            self.rejected = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.endpoints = {}
+
+    def connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def throttled(self):
+        with self.lock:
+            self.rejected += 1
+
+    def record(self, method, endpoint, bytes_in, bytes_out):
+        with self.lock:
+            self.requests += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            key = "{} {}".format(method, endpoint)
+            self.endpoints[key] = self.endpoints.get(key, 0) + 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send headers and body together, so keep-alive connections don't stall
+    # on delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        # stands in for the TCP and TLS handshakes of a new connection
+        if self.server.connect_latency:
+            time.sleep(self.server.connect_latency)
+        self.server.stats.connection()
+        super().setup()
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def handle_request(self, method):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.throttle():
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            server.stats.throttled()
+            return
+
+        url = urlparse(self.path)
+        query = {key.rstrip("[]"): values for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length).decode("utf-8")) if length else {}
+
+        path = url.path.strip("/")
+        endpoint = re.sub(r"/[A-Z0-9]+(?=/|$)", "/{id}", path)
+        try:
+            status, response = server.route(method, path, query, body)
+        except KeyError as e:
+            status, response = 400, {"error": {"message": "missing {}".format(e)}}
+
+        data = json.dumps(response).encode("utf-8")
+
+        # GETs carry an ETag, and a matching If-None-Match gets a 304 with no body
+        etag = None
+        if method == "GET" and status == 200:
+            etag = '"{}"'.format(hashlib.sha1(data).hexdigest()[:16])
+            if self.headers.get("If-None-Match") == etag:
+                status, data = 304, b""
+
+        compressed = "gzip" in self.headers.get("Accept-Encoding", "") and data
+        if compressed:
+            data = gzip.compress(data)
+        server.stats.record(method, endpoint, length, len(data))
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+        if compressed:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, data=None, latency=0, connect_latency=0, rate_limit=None, port=0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.data = data or Data()
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.stats = Stats()
+        self.rate_limit = rate_limit
+        self.window = (0, 0)
+        self.window_lock = threading.Lock()
+
+    def throttle(self):
+        """True if this request goes over `rate_limit` requests per second."""
+        if not self.rate_limit:
+            return False
+
+        with self.window_lock:
+            second, count = self.window
+            now = int(time.time())
+            if now != second:
+                second, count = now, 0
+            self.window = (second, count + 1)
+            return count >= self.rate_limit
+
+    @property
+    def api_base(self):
+        return "http://127.0.0.1:{}/".format(self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def page(self, name, items, query):
+        offset = int(query.get("offset", ["0"])[0])
+        limit = min(int(query.get("limit", ["25"])[0]), MAX_PAGE_SIZE)
+        response = {
+            name: items[offset:offset + limit],
+            "offset": offset,
+            "limit": limit,
+            "more": offset + limit < len(items),
+            "total": None,
+        }
+        if query.get("total", ["false"])[0] == "true":
+            response["total"] = len(items)
+        return 200, response
+
+    def search(self, items, query):
+        if "query" not in query:
+            return items
+        term = query["query"][0].lower()
+        return [item for item in items if term in item["name"].lower() or term in item.get("email", "").lower()]
+
+    def route(self, method, path, query, body):
+        data = self.data
+        parts = path.split("/")
+
+        if parts[0] == "incidents":
+            if method == "GET" and len(parts) == 1:
+                incidents = data.incidents
+                if "statuses" in query:
+                    incidents = [i for i in incidents if i["status"] in query["statuses"]]
+                if "user_ids" in query:
+                    incidents = [i for i in incidents if i["assignments"][0]["assignee"]["id"] in query["user_ids"]]
+                if "since" in query:
+                    incidents = [i for i in incidents if i["created_at"] >= query["since"][0]]
+                if "until" in query:
+                    incidents = [i for i in incidents if i["created_at"] < query["until"][0]]
+                return self.page("incidents", incidents, query)
+
+            if method == "PUT" and len(parts) == 1:
+                updated = []
+                for change in body["incidents"]:
+                    incident = data.incident(change["id"])
+                    if incident is None:
+                        return 404, {"error": {"message": "Incident Not Found"}}
+                    self.update(incident, change)
+                    updated.append(incident)
+                return 200, {"incidents": updated}
+
+            incident = data.incident(parts[1])
+            if incident is None:
+                return 404, {"error": {"message": "Incident Not Found"}}
+
+            if len(parts) == 2 and method == "GET":
+                return 200, {"incident": incident}
+            if len(parts) == 2 and method == "PUT":
+                self.update(incident, body["incident"])
+                return 200, {"incident": incident}
+            if parts[2:] == ["snooze"] and method == "POST":
+                return 201, {"incident": incident}
+            if parts[2:] == ["alerts"] and method == "GET":
+                return self.page("alerts", [make_alert(incident)], query)
+
+        if path == "alerts" and method == "GET":
+            incident = data.incident(query["incident_id"][0])
+            return self.page("alerts", [make_alert(incident)] if incident else [], query)
+
+        if path == "log_entries" and method == "GET":
+            since = query.get("since", [""])[0]
+            until = query.get("until", ["~"])[0]
+            return self.page("log_entries", [e for e in data.log_entries if since <= e["created_at"] < until], query)
+
+        if path == "users" and method == "GET":
+            return self.page("users", self.search(data.users, query), query)
+
+        if path == "escalation_policies" and method == "GET":
+            return self.page("escalation_policies", self.search(data.policies, query), query)
+
+        if path == "oncalls" and method == "GET":
+            oncalls = data.oncalls
+            if "escalation_policy_ids" in query:
+                oncalls = [o for o in oncalls if o["escalation_policy"]["id"] in query["escalation_policy_ids"]]
+            if "schedule_ids" in query:
+                oncalls = [o for o in oncalls if o["schedule"]["id"] in query["schedule_ids"]]
+            return self.page("oncalls", oncalls, query)
+
+        if parts[0] == "schedules" and method == "GET":
+            if len(parts) == 1:
+                return self.page("schedules", self.search(data.schedules, query), query)
+
+            schedule = next((s for s in data.schedules if s["id"] == parts[1]), None)
+            if schedule is None:
+                return 404, {"error": {"message": "Schedule Not Found"}}
+
+            since = query.get("since", ["2019-02-01T00:00:00Z"])[0]
+            until = query.get("until", [since])[0]
+            rendered = dict(schedule)
+            rendered["final_schedule"] = {
+                "name": "Final Schedule",
+                "rendered_schedule_entries": self.shifts(int(parts[1][len("PSCHED"):]), since, until),
+            }
+            return 200, {"schedule": rendered}
+
+        if parts[0] == "schedules" and parts[2:] == ["overrides"] and method == "POST":
+            override = dict(body["override"], id="POVR{}".format(len(data.overrides)))
+            data.overrides.append(override)
+            return 201, {"override": override}
+
+        return 404, {"error": {"message": "Not Found"}}
+
+    def shifts(self, number, since, until):
+        """A weekly rotation through the users, cut off at since and until like pagerduty's."""
+        def seconds(value):
+            return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+        def stamp(seconds):
+            return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        since, until = seconds(since), seconds(until)
+        week = 7 * DAY
+        entries = []
+        for start in range(since - since % week, until, week):
+            user = self.data.users[(start // week + number) % len(self.data.users)]
+            entries.append({
+                "start": stamp(max(start, since)),
+                "end": stamp(min(start + week, until)),
+                "user": {"id": user["id"], "type": "user_reference", "summary": user["summary"]},
+            })
+        return entries
+
+    def update(self, incident, change):
+        if "status" in change:
+            incident["status"] = change["status"]
+            self.data.log(incident, {"acknowledged": "acknowledge", "resolved": "resolve"}.get(change["status"], "trigger"))
+        if "assignments" in change:
+            assignee = change["assignments"][0]["assignee"]
+            user = next((u for u in self.data.users if u["id"] == assignee["id"]), None)
+            if user:
+                incident["assignments"] = [{"assignee": {"id": user["id"], "type": "user_reference", "summary": user["summary"]}}]
+                self.data.log(incident, "assign")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve fake pagerduty data")
+    parser.add_argument("--port", type=int, default=8910)
+    parser.add_argument("--incidents", type=int, default=500)
+    parser.add_argument("--latency", type=int, default=0, help="milliseconds to wait before answering each request")
+    parser.add_argument("--connect-latency", type=int, default=0, help="milliseconds to wait on each new connection")
+    parser.add_argument("--rate-limit", type=int, default=None, help="requests per second to allow before answering 429")
+    args = parser.parse_args()
+
+    server = MockServer(
+        Data(incidents=args.incidents),
+        latency=args.latency / 1000,
+        connect_latency=args.connect_latency / 1000,
+        rate_limit=args.rate_limit,
+        port=args.port,
+    )
+    print("serving on {} as {}".format(server.api_base, server.data.me["email"]))
+    server.serve_forever()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Startup cost of the pd entry point, measured with `python -X importtime`.
+#
+# Exits non-zero if the time spent importing modules goes over budget, so it
+# can be run after changes to catch a heavy import sneaking back in.
+import statistics
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RUNS = 5
+
+# milliseconds spent importing, not counting the interpreter's own startup
+BUDGETS = {
+    # just argument parsing, nothing should be loaded
+    "pd --help": 60,
+    # what `pd summary` loads before its first request
+    "pd summary (imports)": 200,
+    # what pd loads to hand a command to pd daemon
+    "pd summary (daemon)": 40,
+}
+
+COMMANDS = {
+    "pd --help": [str(ROOT / "pd"), "--help"],
+    "pd summary (imports)": ["-c", "import lib.cli, lib.pagerduty, crayons"],
+    "pd summary (daemon)": ["-c", "import lib.daemon, socket"],
+}
+
+
+def import_time(args):
+    """Total microseconds spent importing, from the top level lines of -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + args,
+        cwd=str(ROOT),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # nested imports are indented, and already counted in their parent
+        if not name.startswith(" " * 2):
+            total += int(cumulative)
+    return total
+
+
+def wall_time(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=str(ROOT), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    baseline = statistics.median(wall_time(["-c", "pass"]) for _ in range(RUNS))
+    print("interpreter startup: {:.0f}ms".format(baseline * 1000))
+
+    over = False
+    for name, args in COMMANDS.items():
+        imports = statistics.median(import_time(args) for _ in range(RUNS)) / 1000
+        wall = statistics.median(wall_time(args) for _ in range(RUNS)) * 1000
+        budget = BUDGETS[name]
+        status = "ok" if imports <= budget else "OVER BUDGET"
+        over = over or imports > budget
+        print("{:<24} {:>7.1f}ms importing (budget {}ms) {:>7.1f}ms wall  {}".format(name, imports, budget, wall, status))
+
+    sys.exit(1 if over else 0)
@@ -0,0 +1,70 @@
+import json
+import time
+
+import pygerduty.v2
+
+
+def make_incident(number, status="triggered", incident_key=True):
+    incident_id = "P{:06d}".format(number)
+    return {
+        "id": incident_id,
+        "type": "incident",
+        "incident_number": number,
+        "title": "Plan does not match remote state for: repo-{} in Workspace: default".format(number % 50),
+        "summary": "[#{}] synthetic incident".format(number),
+        "status": status,
+        "urgency": "high",
+        "created_at": "2019-02-{:02d}T{:02d}:{:02d}:00Z".format(1 + number % 28, number % 24, number % 60),
+        "last_status_change_at": "2019-03-01T00:00:00Z",
+        "html_url": "https://example.pagerduty.com/incidents/{}".format(incident_id),
+        "incident_key": "key-{}".format(number) if incident_key else None,
+        "service": {"id": "PSVC{}".format(number % 10), "type": "service_reference", "summary": "service {}".format(number % 10)},
+        "assignments": [{"assignee": {"id": "PUSER1", "type": "user_reference", "summary": "Synthetic User"}}],
+    }
+
+
+def make_alert(incident):
+    return {
+        "id": "A" + incident["id"],
+        "type": "alert",
+        "alert_key": "key-{}".format(incident["incident_number"]),
+        "created_at": incident["created_at"],
+        "incident": {"id": incident["id"], "type": "incident_reference"},
+        "body": {"details": {"number": incident["incident_number"]}, "contexts": []},
+    }
+
+
+class SyntheticPager(pygerduty.v2.PagerDuty):
+    """A pygerduty client answering from generated data instead of the network.
+
+    Counts every request it's asked to make, and can sleep for `latency`
+    seconds per request to stand in for round-trip time.
+    """
+
+    def __init__(self, incidents, latency=0):
+        super().__init__("synthetic")
+        self.data = incidents
+        self.latency = latency
+        self.requests = 0
+
+    def request(self, method, path, query_params=None, data=None, extra_headers=None):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        query_params = query_params or {}
+        offset = int(query_params.get("offset", 0))
+        limit = int(query_params.get("limit", self.page_size))
+
+        if method == "GET" and path == "incidents":
+            page = self.data[offset:offset + limit]
+            return {"incidents": page, "offset": offset, "limit": limit, "more": offset + limit < len(self.data)}
+
+        if method == "GET" and path == "alerts":
+            incident = next(i for i in self.data if i["id"] == query_params["incident_id"])
+            return {"alerts": [make_alert(incident)][offset:], "more": False}
+
+        if method == "PUT" and path == "incidents":
+            return json.loads(data)
+
+        raise NotImplementedError("{} {}".format(method, path))
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# Multi-page incident listings over the pooled and plain urllib transports.
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.server import Data, MockServer
+from lib.pagerduty import Pagerduty
+
+INCIDENTS = 1000
+LATENCY = 0.01
+CONNECT_LATENCY = 0.03
+
+
+if __name__ == '__main__':
+    server = MockServer(Data(incidents=INCIDENTS), latency=LATENCY, connect_latency=CONNECT_LATENCY).start()
+    print("{} incidents, {}ms per request, {}ms per new connection\n".format(
+        INCIDENTS, int(LATENCY * 1000), int(CONNECT_LATENCY * 1000),
+    ))
+
+    for transport in ["urllib", "pooled"]:
+        server.stats.reset()
+        pd = Pagerduty("bench", server.data.me["email"], api_base=server.api_base, transport=transport)
+
+        start = time.perf_counter()
+        count = len(list(pd.incidents()))
+        elapsed = time.perf_counter() - start
+
+        print("{:<8} {} incidents in {:.2f}s, {} requests, {} connections, {} bytes".format(
+            transport, count, elapsed, server.stats.requests, server.stats.connections, server.stats.bytes_out,
+        ))
+
+    server.shutdown()
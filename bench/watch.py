@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# What one refresh of `pd watch` costs next to re-running `pd summary --all`.
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.server import Data, MockServer
+from lib.pagerduty import Pagerduty
+from lib.watch import Watcher
+
+INCIDENTS = 2000
+LATENCY = 0.02
+POLLS = 10
+
+
+def timed(name, server, func):
+    server.stats.reset()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    count = 0
+    for _ in range(POLLS):
+        count += func()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    print("{:<32} {:>8.1f}ms {:>8.1f}ms cpu {:>6.1f} requests {:>6} incidents".format(
+        name, elapsed / POLLS * 1000, cpu / POLLS * 1000, server.stats.requests / POLLS, count,
+    ))
+
+
+if __name__ == '__main__':
+    server = MockServer(Data(incidents=INCIDENTS), latency=LATENCY).start()
+    print("{} incidents, {}ms per request, per refresh:\n".format(INCIDENTS, int(LATENCY * 1000)))
+
+    pd = Pagerduty("bench", server.data.me["email"], api_base=server.api_base)
+    watcher = Watcher(pd)
+    watcher.start()
+
+    timed("full listing", server, lambda: len(list(pd.incidents())))
+    timed("watch, nothing changed", server, lambda: len(watcher.poll()))
+
+    def some_changes():
+        for _ in range(3):
+            server.data.trigger()
+        return len(watcher.poll())
+
+    timed("watch, 3 new incidents", server, some_changes)
+
+    server.shutdown()
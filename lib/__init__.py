@@ -1,4 +1,21 @@
-from .pagerduty import Pagerduty, Incident
-from .cli import Cli
+# everything is loaded on first use, so that importing lib (which the pd
+# script does on every run) doesn't drag in pygerduty or read the config, and
+# commands handed to pd daemon don't even need the cli
 
-pd = Pagerduty.from_config()
+
+def __getattr__(name):
+    if name == 'Cli':
+        from .cli import Cli
+        return Cli
+
+    if name in ['Pagerduty', 'Incident']:
+        from . import pagerduty
+        return getattr(pagerduty, name)
+
+    if name == 'pd':
+        global pd
+        from .pagerduty import Pagerduty
+        pd = Pagerduty.from_config()
+        return pd
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
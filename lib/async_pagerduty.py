@@ -0,0 +1,307 @@
+import asyncio
+import json
+
+import aiohttp
+import pygerduty.v2
+
+from pygerduty.common import _json_dumper, clean_response
+from pygerduty.exceptions import BadRequest, NotFound
+from urllib.parse import urljoin
+
+from .classify import Classifier
+from .paginate import PAGE_SIZE
+from .pagerduty import (
+    ActionError,
+    Alert,
+    Oncalls,
+    Pagerduty,
+    client_options,
+    group_by_summary,
+    group_oncalls,
+    read_config,
+)
+from .scheduler import DEFAULT_RATE_LIMIT, RequestScheduler
+from .transport import RETRY_STATUSES
+
+
+class AsyncPagerduty():
+    """An asyncio version of Pagerduty, for running lots of calls at once.
+
+    All requests share one aiohttp session (and its connection pool), so
+    hundreds of operations can be in flight in the same event loop. Use it as
+    an async context manager, or call `close()` when done:
+
+        async with AsyncPagerduty.from_config() as pd:
+            await asyncio.gather(*(pd.ack(_id) for _id in ids))
+
+    Lookups that fail raise ActionError rather than exiting. Incident.alerts
+    can't be fetched lazily here, so use `incidents(with_alerts=True)` or
+    `prefetch_alerts` before reading alerts or dedup keys.
+    """
+
+    MAX_SNOOZE_DURATION = Pagerduty.MAX_SNOOZE_DURATION
+    BULK_UPDATE_SIZE = Pagerduty.BULK_UPDATE_SIZE
+    API_BASE = "https://api.pagerduty.com/"
+
+    # shared with Pagerduty, they only touch the cache and classifier
+    _cached = Pagerduty._cached
+    _store = Pagerduty._store
+    _cached_oncalls = Pagerduty._cached_oncalls
+    _store_oncalls = Pagerduty._store_oncalls
+    timer = Pagerduty.timer
+    make_incident = Pagerduty.make_incident
+
+    @classmethod
+    def from_config(cls, **kwargs):
+        return cls(**dict(client_options(read_config()), **kwargs))
+
+    def __init__(self, api_key, email, cache = None, classifier = None, api_base = None, timeout = 10, retries = 2, rate_limit = DEFAULT_RATE_LIMIT, max_connections = 100):
+        # never makes requests, just gives pygerduty containers something to hang off
+        self.pager = pygerduty.v2.PagerDuty(api_key)
+        self.api_key = api_key
+        self.api_base = api_base or AsyncPagerduty.API_BASE
+        self.email = email
+        self.cache = cache
+        self.classifier = classifier or Classifier()
+        self.timeout = timeout
+        self.retries = retries
+        self.max_connections = max_connections
+        # only its token bucket and backoff are used here, the connection
+        # limit on the session does the job of its concurrency limit
+        self.scheduler = RequestScheduler(rate_limit = rate_limit)
+        self.instrumentation = None
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector = aiohttp.TCPConnector(limit = self.max_connections),
+                timeout = aiohttp.ClientTimeout(total = self.timeout),
+                headers = {
+                    "Accept": "application/vnd.pagerduty+json;version=2",
+                    "Content-type": "application/json",
+                    "Authorization": "Token token={}".format(self.api_key),
+                },
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def request(self, method, path, query_params = None, data = None, extra_headers = None):
+        url = urljoin(self.api_base, path)
+        if query_params:
+            url += "?{}".format(pygerduty.v2.PagerDuty._process_query_params(query_params))
+
+        attempt = 0
+        while True:
+            wait = self.scheduler.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+
+            async with self.session.request(method, url, data = data, headers = extra_headers) as response:
+                body = await response.text()
+                status = response.status
+                headers = response.headers
+
+            if status == 429 and attempt < RequestScheduler.RETRIES:
+                await asyncio.sleep(self.scheduler.backoff(attempt, headers))
+                attempt += 1
+                self.scheduler.count("retries")
+                continue
+
+            if status in RETRY_STATUSES and method == "GET" and attempt < self.retries:
+                await asyncio.sleep(RequestScheduler.BACKOFF * 2 ** attempt)
+                attempt += 1
+                continue
+
+            if status == 400:
+                raise BadRequest(json.loads(body))
+            if status == 404:
+                raise NotFound("URL ({0}) Not Found.".format(url))
+            if status >= 400:
+                raise aiohttp.ClientResponseError(response.request_info, (), status = status, message = body)
+
+            return clean_response(json.loads(body)) if body else None
+
+    async def paginate(self, collection, **kwargs):
+        """Everything in a collection; every page after the first is fetched at once."""
+        kwargs = collection._apply_default_kwargs(kwargs)
+
+        def fetch(offset, total = False):
+            params = dict(kwargs, offset = offset, limit = PAGE_SIZE)
+            if total:
+                params['total'] = 'true'
+            return self.request("GET", collection.name, query_params = params)
+
+        responses = [await fetch(0, total = True)]
+        total = responses[0].get('total')
+        if total is None:
+            offset = PAGE_SIZE
+            while responses[-1].get('more'):
+                responses.append(await fetch(offset))
+                offset += PAGE_SIZE
+        else:
+            responses.extend(await asyncio.gather(*(fetch(offset) for offset in range(PAGE_SIZE, total, PAGE_SIZE))))
+
+        items = []
+        seen = set()
+        for response in responses:
+            for item in collection._list_response(response):
+                if item.id not in seen:
+                    seen.add(item.id)
+                    items.append(item)
+        return items
+
+    async def _show(self, collection, _id, **kwargs):
+        response = await self.request("GET", "{}/{}".format(collection.name, _id), query_params = kwargs)
+        return collection.container(collection, **response.get(collection.sname, response))
+
+    async def _find(self, kind, name, label):
+        cached = self._cached(kind, name)
+        if cached:
+            return cached
+
+        found = await self.paginate(getattr(self.pager, kind), query = name)
+        if len(found) == 0:
+            raise ActionError("No {} found with name \"{}\"".format(label, name))
+        if len(found) > 1:
+            raise ActionError("Too many {}s found with name \"{}\": {}".format(
+                label, name, ", ".join(item.name for item in found),
+            ))
+
+        return self._store(kind, name, found[0])
+
+    @property
+    async def me(self):
+        if not hasattr(self, '_me'):
+            self._me = await self.user(self.email)
+        return self._me
+
+    async def user(self, name):
+        return await self._find("users", name, "user")
+
+    async def schedule(self, name):
+        return await self._find("schedules", name, "schedule")
+
+    async def escalation_policy(self, name):
+        return await self._find("escalation_policies", name, "escalation policy")
+
+    async def incidents(self, user_id = None, triggered = False, with_alerts = False):
+        args = {
+            'statuses': ['triggered'],
+            'date_range': 'all',
+        }
+
+        if user_id:
+            args['user_ids'] = [user_id]
+
+        if not triggered:
+            args['statuses'].append('acknowledged')
+
+        incidents = list(map(self.make_incident, await self.paginate(self.pager.incidents, **args)))
+        if with_alerts:
+            await self.prefetch_alerts(incidents)
+        return incidents
+
+    async def alerts(self, incident_id):
+        return list(map(Alert, await self.paginate(self.pager.alerts, incident_id = incident_id)))
+
+    async def prefetch_alerts(self, incidents):
+        pending = [incident for incident in incidents if not hasattr(incident, '_alerts')]
+        alerts = await asyncio.gather(*(self.alerts(incident.raw_id) for incident in pending))
+        for incident, incident_alerts in zip(pending, alerts):
+            incident._alerts = incident_alerts
+        return incidents
+
+    async def oncalls(self, policy_ids = None, schedule_ids = None, refresh = False):
+        query = Pagerduty.oncalls_query(policy_ids, schedule_ids)
+
+        raw = None if refresh else self._cached_oncalls(query)
+        if raw is None:
+            raw = self._store_oncalls(query, await self.paginate(Oncalls(self.pager), **query))
+
+        return group_oncalls(raw)
+
+    async def summary(self, user_id = None, triggered = False):
+        return group_by_summary(await self.incidents(user_id = user_id, triggered = triggered))
+
+    async def show(self, _id):
+        return self.make_incident(await self._show(self.pager.incidents, _id))
+
+    async def _set_status(self, incident, status):
+        data = {"incident": {"type": "incident_reference", "status": status}}
+        await self.request("PUT", "incidents/{}".format(incident.id), data = _json_dumper(data), extra_headers = {"From": self.email})
+
+    async def snooze(self, _id, delta=(24*60*60)):
+        incident = await self._show(self.pager.incidents, _id)
+        if incident.status == "resolved":
+            return "already resolved: {}".format(incident.summary)
+
+        if incident.status == "triggered":
+            await self._set_status(incident, "acknowledged")
+
+        data = {"duration": delta}
+        await self.request("POST", "incidents/{}/snooze".format(incident.id), data = _json_dumper(data), extra_headers = {"From": self.email})
+        return "snoozing {}".format(incident.summary)
+
+    async def ack(self, _id):
+        incident = await self._show(self.pager.incidents, _id)
+        if incident.status != "triggered":
+            raise ActionError("Incident {} is not triggered".format(_id))
+        await self._set_status(incident, "acknowledged")
+        return "acking {}".format(incident.summary)
+
+    async def resolve(self, _id):
+        incident = await self._show(self.pager.incidents, _id)
+        if incident.status == "resolved":
+            return "Incident {} is already resolved".format(_id)
+        await self._set_status(incident, "resolved")
+        return "resolving {}".format(incident.summary)
+
+    async def bulk_update(self, ids, status = None, assignee = None):
+        changes = Pagerduty.bulk_changes(ids, status = status, assignee = assignee)
+        chunks = [changes[start:start + self.BULK_UPDATE_SIZE] for start in range(0, len(changes), self.BULK_UPDATE_SIZE)]
+
+        async def send(chunk):
+            data = _json_dumper({"incidents": chunk})
+            await self.request("PUT", "incidents", data = data, extra_headers = {"From": self.email})
+
+        errors = await asyncio.gather(*(send(chunk) for chunk in chunks), return_exceptions = True)
+
+        results = {}
+        for chunk, error in zip(chunks, errors):
+            for change in chunk:
+                results[change["id"]] = error
+        return results
+
+    async def reassign(self, _id, user):
+        if str(_id).isdigit():
+            _id = (await self._show(self.pager.incidents, _id)).id
+
+        error = (await self.bulk_update([_id], assignee = user.id))[_id]
+        if error:
+            raise error
+
+    async def schedule_at(self, _id, start, end=None):
+        args = { "since": start }
+        if end:
+            args["until"] = end
+
+        return await self._show(self.pager.schedules, _id, **args)
+
+    async def create_override(self, schedule_id, user_id, start, end):
+        data = {"override": {"start": start, "end": end, "user": {"id": user_id, "type": "user_reference"}}}
+        await self.request("POST", "schedules/{}/overrides".format(schedule_id), data = _json_dumper(data))
+        # whoever was cached as on call may not be any more
+        if self.cache:
+            self.cache.clear("oncalls")
@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+import time
+
+from pathlib import Path
+
+
+class Cache():
+    # seconds each kind of lookup stays valid for
+    TTLS = {
+        "users": 7 * 24 * 60 * 60,
+        "schedules": 24 * 60 * 60,
+        "escalation_policies": 24 * 60 * 60,
+        # the longest oncalls are kept; usually the next handoff comes first
+        "oncalls": 24 * 60 * 60,
+    }
+    DEFAULT_TTL = 60 * 60
+
+    @classmethod
+    def default_path(cls):
+        return Path.home() / '.config' / 'pd-cache.json'
+
+    def __init__(self, path = None, ttls = None):
+        self.path = Path(path) if path else Cache.default_path()
+        self.ttls = dict(Cache.TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.lock = threading.RLock()
+
+    @property
+    def data(self):
+        # read again whenever another pd has written the file since, so a
+        # long running one (pd daemon) doesn't save over its changes
+        stamp = self._stamp()
+        if not hasattr(self, '_data') or stamp != self._loaded:
+            self._data = self._load()
+            self._loaded = stamp
+        return self._data
+
+    def _stamp(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        if not self.path.is_file():
+            return {}
+
+        try:
+            with self.path.open() as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if not isinstance(data, dict):
+            return {}
+        return data
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with tmp.open('w') as f:
+            json.dump(self._data, f)
+        os.replace(str(tmp), str(self.path))
+        self._loaded = self._stamp()
+
+    def get(self, kind, key):
+        with self.lock:
+            entry = self.data.get(kind, {}).get(key)
+            if entry is None:
+                return None
+
+            if entry["expires"] is not None and entry["expires"] < time.time():
+                del self.data[kind][key]
+                return None
+
+            return entry["value"]
+
+    def set(self, kind, key, value, ttl = None):
+        if ttl is None:
+            ttl = self.ttls.get(kind, Cache.DEFAULT_TTL)
+
+        with self.lock:
+            self.data.setdefault(kind, {})[key] = {
+                "value": value,
+                "expires": time.time() + ttl if ttl else None,
+            }
+            self._save()
+
+    def delete(self, kind, key):
+        with self.lock:
+            if self.data.get(kind, {}).pop(key, None) is not None:
+                self._save()
+
+    def keys(self, kind):
+        with self.lock:
+            return list(self.data.get(kind, {}).keys())
+
+    def clear(self, kind = None):
+        with self.lock:
+            if kind is None:
+                self.data.clear()
+            else:
+                self.data.pop(kind, None)
+            self._save()
+
+
+RESPONSES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT,
+    path TEXT,
+    etag TEXT,
+    body BLOB,
+    size INTEGER,
+    checked REAL,
+    used REAL
+);
+CREATE INDEX IF NOT EXISTS responses_path ON responses (path);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+
+CREATE TABLE IF NOT EXISTS stats (
+    endpoint TEXT,
+    outcome TEXT,
+    count INTEGER,
+    PRIMARY KEY (endpoint, outcome)
+);
+"""
+
+HIT = "hits"
+REVALIDATED = "revalidated"
+MISS = "misses"
+OUTCOMES = [HIT, REVALIDATED, MISS]
+
+
+class ResponseCache():
+    """Raw GET responses from endpoints that barely change, in sqlite.
+
+    Used by transport.CachingOpener. A response is served as it is for its
+    endpoint's ttl, after which it's revalidated with If-None-Match if
+    pagerduty gave it an ETag, or fetched again if not. Once they add up to
+    more than `max_bytes` the least recently used responses are dropped.
+    """
+
+    # seconds each endpoint's responses are used without asking pagerduty
+    TTLS = {
+        "users": 24 * 60 * 60,
+        "escalation_policies": 24 * 60 * 60,
+        "services": 24 * 60 * 60,
+        # shorter, as other people's overrides show up in rendered schedules
+        "schedules": 10 * 60,
+    }
+    MAX_BYTES = 16 * 1024 * 1024
+
+    @classmethod
+    def default_path(cls):
+        return Path.home() / '.config' / 'pd-responses.sqlite'
+
+    def __init__(self, path = None, ttls = None, max_bytes = None):
+        self.path = Path(path) if path else ResponseCache.default_path()
+        self.ttls = dict(ResponseCache.TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_bytes = max_bytes or ResponseCache.MAX_BYTES
+        self.lock = threading.Lock()
+        # for this run only, see `stats` for all time
+        self.counts = dict.fromkeys(OUTCOMES, 0)
+
+    @property
+    def db(self):
+        if not hasattr(self, '_db'):
+            import sqlite3
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # shared by the client's threads; every statement commits itself,
+            # and losing the last few to a crash only costs a refetch
+            self._db = sqlite3.connect(str(self.path), timeout = 10, check_same_thread = False, isolation_level = None)
+            self._db.execute("PRAGMA synchronous = OFF")
+            self._db.executescript(RESPONSES_SCHEMA)
+        return self._db
+
+    def get(self, key, ttl):
+        """(etag, body, fresh) for a cached response, or None.
+
+        Fresh means it was fetched or last revalidated less than `ttl` seconds ago.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT etag, body, checked FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            now = time.time()
+            self.db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+            etag, body, checked = row
+            return etag, body, checked + ttl > now
+
+    def put(self, key, endpoint, path, etag, body):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, path, etag, body, size, checked, used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, path, etag, body, len(body), now, now),
+            )
+            self._evict()
+
+    def touch(self, key):
+        """Pagerduty says it hasn't changed, so it's fresh again."""
+        with self.lock:
+            self.db.execute("UPDATE responses SET checked = ? WHERE key = ?", (time.time(), key))
+
+    def _evict(self):
+        total = self.db.execute("SELECT coalesce(sum(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # down to 3/4 full, so this isn't done again on every put
+        dropped = 0
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY used").fetchall():
+            if total - dropped <= self.max_bytes * 3 // 4:
+                break
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            dropped += size
+
+    def invalidate(self, path):
+        """Forget responses for `path` and anything under it, eg. after changing it."""
+        with self.lock:
+            self.db.execute("DELETE FROM responses WHERE path = ? OR path LIKE ?", (path, path + "/%"))
+
+    def count(self, endpoint, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+            self.db.execute(
+                "INSERT INTO stats (endpoint, outcome, count) VALUES (?, ?, 1) ON CONFLICT (endpoint, outcome) DO UPDATE SET count = count + 1",
+                (endpoint, outcome),
+            )
+
+    def stats(self):
+        """{endpoint: {"responses", "bytes", "hits", "revalidated", "misses"}} since the cache was made."""
+        stats = {}
+        with self.lock:
+            for endpoint, responses, size in self.db.execute("SELECT endpoint, count(*), sum(size) FROM responses GROUP BY endpoint"):
+                stats[endpoint] = dict(dict.fromkeys(OUTCOMES, 0), responses = responses, bytes = size)
+            for endpoint, outcome, count in self.db.execute("SELECT endpoint, outcome, count FROM stats"):
+                stats.setdefault(endpoint, dict(dict.fromkeys(OUTCOMES, 0), responses = 0, bytes = 0))[outcome] = count
+        return stats
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
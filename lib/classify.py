@@ -0,0 +1,192 @@
+import json
+import parse
+import re
+import string
+
+from functools import lru_cache
+
+DEFAULT_RULES = [
+    {
+        "class": "outdated instance",
+        "template": "Outdated running instance ({simple_name} - {instance_id}) found in {environment}",
+        "summary": "outdated instance: {simple_name}",
+        # drop the availability zone, ie: foo-us-east-1a -> foo
+        "rewrite": {"simple_name": ["-us-east-1.$", ""]},
+    },
+    {
+        "class": "terraform plan",
+        "template": "Plan does not match remote state for: {repo} in Workspace: {workspace}",
+        "summary": "terraform plan: {repo}",
+    },
+]
+
+
+def format_fields(text):
+    """The fields named in a format string, eg. "{repo} in {workspace}" -> ["repo", "workspace"]."""
+    return [re.split(r"[.\[]", name)[0] for _, name, _, _ in string.Formatter().parse(text) if name is not None]
+
+
+def regex_literal(regex):
+    """Text every match of a regex starts with, eg. "Disk (?P<pct>\\d+)% full" -> "Disk ".
+
+    Errs on the short side: it stops at anything that isn't a plain
+    character, and is empty if the regex has a top level alternative.
+    """
+    depth = 0
+    escaped = in_class = False
+    for char in regex:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return ""
+
+    literal = ""
+    i = 1 if regex.startswith("^") else 0
+    while i < len(regex):
+        char = regex[i]
+        if char == "\\" and i + 1 < len(regex) and not regex[i + 1].isalnum():
+            char, step = regex[i + 1], 2
+        elif char in ".^$*+?{}[]()|\\":
+            break
+        else:
+            step = 1
+
+        following = regex[i + step:i + step + 1]
+        if following in ["*", "?", "{"]:
+            # might not be there at all
+            break
+        literal += char
+        if following == "+":
+            break
+        i += step
+    return literal
+
+
+class Rule():
+    """One way of recognising an incident title.
+
+    Exactly one of `prefix` (the title starts with it), `regex` (named groups
+    become the parsed fields) or `template` (a `parse` format string) should
+    be given. `summary` is formatted with the parsed fields to give the name
+    incidents are grouped under.
+    """
+
+    def __init__(self, klass, prefix = None, regex = None, template = None, summary = None, rewrite = None):
+        self.klass = klass
+        self.summary = summary
+        # everything the rule was made from, to tell when rules have changed
+        self.key = [klass, prefix, regex, template, summary, rewrite]
+        self.rewrite = {}
+        for field, (pattern, replacement) in (rewrite or {}).items():
+            self.rewrite[field] = (re.compile(pattern), replacement)
+
+        if template is not None:
+            self.literal = template.split("{", 1)[0]
+            parser = parse.compile(template)
+            self._match = lambda title: parser.parse(title)
+            fields = set(format_fields(template))
+        elif regex is not None:
+            self.literal = regex_literal(regex)
+            pattern = re.compile(regex)
+            self._match = lambda title: pattern.match(title)
+            fields = set(pattern.groupindex)
+        elif prefix is not None:
+            self.literal = prefix
+            self._match = lambda title: title.startswith(prefix)
+            fields = set()
+        else:
+            raise ValueError("classification rule for \"{}\" needs a prefix, regex or template".format(klass))
+
+        # caught here rather than as a KeyError halfway through listing incidents
+        for field in format_fields(summary or ""):
+            if field not in fields:
+                raise ValueError("summary for \"{}\" uses {{{}}}, which its rule doesn't capture".format(klass, field))
+
+    @classmethod
+    def from_config(cls, conf):
+        return cls(
+            conf["class"],
+            prefix = conf.get("prefix"),
+            regex = conf.get("regex"),
+            template = conf.get("template"),
+            summary = conf.get("summary"),
+            rewrite = conf.get("rewrite"),
+        )
+
+    def apply(self, title):
+        match = self._match(title)
+        if not match:
+            return None
+
+        if match is True:
+            parsed = {}
+        elif isinstance(match, parse.Result):
+            parsed = dict(match.named)
+        else:
+            parsed = match.groupdict()
+
+        for field, (pattern, replacement) in self.rewrite.items():
+            if field in parsed:
+                parsed[field] = pattern.sub(replacement, parsed[field])
+
+        summary = self.summary.format(**parsed) if self.summary else None
+        return parsed, summary
+
+
+class Classifier():
+    """Matches incident titles against a list of rules, first match wins.
+
+    Rules are indexed in a trie on their literal prefix, so a title is only
+    tried against the rules that could possibly match it rather than every
+    rule in turn. Results are memoized per title since the same alerts tend to
+    fire over and over.
+    """
+
+    CACHE_SIZE = 4096
+
+    def __init__(self, rules = None):
+        if rules is None:
+            rules = DEFAULT_RULES
+        self.rules = [rule if isinstance(rule, Rule) else Rule.from_config(rule) for rule in rules]
+        self.key = json.dumps([rule.key for rule in self.rules], sort_keys=True)
+
+        self.trie = {}
+        for index, rule in enumerate(self.rules):
+            node = self.trie
+            for char in rule.literal:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(index)
+
+        self.classify = lru_cache(maxsize=Classifier.CACHE_SIZE)(self._classify)
+
+    def candidates(self, title):
+        node = self.trie
+        found = list(node.get(None, []))
+        for char in title:
+            node = node.get(char)
+            if node is None:
+                break
+            found.extend(node.get(None, []))
+        found.sort()
+        return found
+
+    def _classify(self, title):
+        """Returns (class, parsed fields, summary) for a title; (None, {}, None) if nothing matches."""
+        for index in self.candidates(title):
+            rule = self.rules[index]
+            result = rule.apply(title)
+            if result is not None:
+                parsed, summary = result
+                return rule.klass, parsed, summary
+
+        return None, {}, None
@@ -1,22 +1,20 @@
 import argparse
-import crayons
-import json
-import maya
-import os
 import sys
 import textwrap
-from .pagerduty import Pagerduty, Incident
-from .utils import duration_seconds, duration_delta
+from .output import FORMATS, Output
+from .utils import DEFAULT_CONCURRENCY, duration_seconds, duration_delta, parse_time, run_all, timestamp
 # from dateutil.parser import parse as date_parse
-from tabulate import tabulate
-from urllib.parse import urlparse
-from webbrowser import open as webopen
 
-status_colors = {
-    "triggered": crayons.red,
-    "acknowledged": crayons.yellow,
-    "resolved": crayons.green,
-}
+# heavier dependencies (crayons, maya, tabulate, pygerduty...) are imported by
+# the commands that use them, so `pd --help` and friends start quickly
+
+def status_color(status):
+    import crayons
+    return {
+        "triggered": crayons.red,
+        "acknowledged": crayons.yellow,
+        "resolved": crayons.green,
+    }[status]
 
 def indent(text):
     return textwrap.indent(str(text), ' ' * 4)
@@ -26,31 +24,61 @@ class Cli():
     @property
     def client(self):
         if not hasattr(self, '_pd_client'):
+            from .pagerduty import Pagerduty
             self._pd_client = Pagerduty.from_config()
+            if getattr(self, 'instrumentation', None):
+                self._pd_client.instrument(self.instrumentation)
         return self._pd_client
 
-    def main(self):
+    @property
+    def store(self):
+        if not hasattr(self, '_store'):
+            from .store import Store
+            self._store = Store()
+        return self._store
+
+    def main(self, argv = None):
         parser = argparse.ArgumentParser()
+        parser.add_argument("--profile", help="print a breakdown of where the time went when done", action="store_true", default=False)
+        parser.add_argument("--profile-json", metavar="file", help="write the --profile breakdown to a json file")
+        parser.add_argument("--output", "-o", choices=FORMATS, default="text", help="print records as a json array or one json object per line (summary, show, who, ack, snooze, resolve, ackall, schedule export, cache stats)")
         subparsers = parser.add_subparsers(dest="cmd")
 
         list_parser = subparsers.add_parser("summary", help="Print summary of pagerduty incidents")
-        list_parser.set_defaults(func=self.summary)
+        list_parser.set_defaults(func=self.summary, records=True)
         list_parser.add_argument("--user", "-u", metavar="query", help="show summary for a specific user by name or email address")
         list_parser.add_argument("--triggered", help="show only triggered incidents", action="store_true", default=False)
         list_parser.add_argument("--long", "-l", help="show long form summary", dest="show_long", action="store_true", default=False)
         list_parser.add_argument("--short", "-s", help="show short form summary", dest="show_short", action="store_true", default=False)
         list_parser.add_argument("--all", "-a", help="show all open incidents", dest="show_all", action="store_true", default=False)
-
-        show_parser = subparsers.add_parser("show", help="Show a pagerduty incident")
-        show_parser.set_defaults(func=self.show)
-        show_parser.add_argument("id", help="ID of incident to show")
+        list_parser.add_argument("--cluster", help="with --short, group unclassified incidents whose titles only differ in a few words (ids, numbers, hostnames...)", action="store_true", default=False)
+        list_parser.add_argument("--offline", help="read incidents from the local store (see pd sync) instead of pagerduty", action="store_true", default=False)
+
+        watch_parser = subparsers.add_parser("watch", help="Print open incidents, then keep printing whatever changes")
+        watch_parser.set_defaults(func=self.watch)
+        watch_parser.add_argument("--user", "-u", metavar="query", help="watch a specific user's incidents, by name or email address")
+        watch_parser.add_argument("--triggered", help="watch only triggered incidents", action="store_true", default=False)
+        watch_parser.add_argument("--long", "-l", help="show incident urls too", dest="show_long", action="store_true", default=False)
+        watch_parser.add_argument("--all", "-a", help="watch all open incidents", dest="show_all", action="store_true", default=False)
+        watch_parser.add_argument("--interval", "-n", type=float, default=10, metavar="seconds", help="how often to check for changes (default: %(default)s)")
+
+        show_parser = subparsers.add_parser("show", help="Show pagerduty incidents")
+        show_parser.set_defaults(func=self.show, records=True)
+        show_parser.add_argument("ids", nargs="+", metavar="id", help="IDs of incidents to show")
+        show_parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY, metavar="n", help="number of incidents to fetch at once (default: %(default)s)")
+        show_parser.add_argument("--offline", help="read the incident from the local store (see pd sync) instead of pagerduty", action="store_true", default=False)
+
+        sync_parser = subparsers.add_parser("sync", help="Copy incidents and their alerts into a local store, for --offline and analysis")
+        sync_parser.set_defaults(func=self.sync)
+        sync_parser.add_argument("--since", metavar="date", help="for the first sync, how far back to go (default: 30 days ago)")
+        sync_parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY, metavar="n", help="number of incidents to fetch alerts for at once (default: %(default)s)")
 
         ack_parser = subparsers.add_parser("ack", help="Ack a pagerduty incident")
-        ack_parser.set_defaults(func=self.ack)
-        ack_parser.add_argument("ids", nargs="+", help="IDs of incident to ack")
+        ack_parser.set_defaults(func=self.ack, records=True)
+        ack_parser.add_argument("ids", nargs="*", help="IDs of incident to ack")
 
         ackall_parser = subparsers.add_parser("ackall", help="Ack all pagerduty incidents")
-        ackall_parser.set_defaults(func=self.ackall)
+        ackall_parser.set_defaults(func=self.ackall, records=True)
 
         assign_parser = subparsers.add_parser("assign", help="(re)assign an incident to another pagerduty user")
         assign_parser.set_defaults(func=self.assign)
@@ -58,16 +86,19 @@ class Cli():
         assign_parser.add_argument("user", metavar="query", help="user to reassign incident to (by name or email)")
 
         snooze_parser = subparsers.add_parser("snooze", help="Snooze pagerduty incidents (also acks them first)")
-        snooze_parser.set_defaults(func=self.snooze)
+        snooze_parser.set_defaults(func=self.snooze, records=True)
         snooze_parser.add_argument("--duration", "-d", help="length of time to snooze, in 2d6h3m format", default="24h", metavar="time")
-        snooze_parser.add_argument("ids", nargs="+", help="IDs of incidents to snooze")
+        snooze_parser.add_argument("ids", nargs="*", help="IDs of incidents to snooze")
 
         resolve_parser = subparsers.add_parser("resolve", help="Resolve pagerduty incidents")
-        resolve_parser.set_defaults(func=self.resolve)
-        resolve_parser.add_argument("ids", nargs="+", help="IDs of incidents to resolve")
+        resolve_parser.set_defaults(func=self.resolve, records=True)
+        resolve_parser.add_argument("ids", nargs="*", help="IDs of incidents to resolve")
 
         who_parser = subparsers.add_parser("who", help="Find out who's on call")
-        who_parser.set_defaults(func=self.who)
+        who_parser.set_defaults(func=self.who, records=True)
+        who_parser.add_argument("--policy", "-p", action="append", metavar="name", help="only show this escalation policy (can be given more than once)")
+        who_parser.add_argument("--schedule", "-s", action="append", metavar="name", help="only show levels on this schedule (can be given more than once)")
+        who_parser.add_argument("--refresh", "-r", help="don't use cached oncalls", action="store_true", default=False)
 
         open_parser = subparsers.add_parser("open", help="Open pagerduty issues in your web browser")
         open_parser.set_defaults(func=self.open)
@@ -80,14 +111,80 @@ class Cli():
         override_parser.add_argument("start", help="Start of override (date time, in the schedule's timezone)")
         override_parser.add_argument("duration", help="length of override, in 2d6h3m format")
 
+        schedule_parser = subparsers.add_parser("schedule", help="Work with schedules")
+        schedule_subparsers = schedule_parser.add_subparsers(dest="schedule_cmd")
+
+        schedule_export_parser = schedule_subparsers.add_parser("export", help="Print who's on call on some schedules over a range of dates, as csv or ics")
+        schedule_export_parser.set_defaults(func=self.schedule_export, records=True)
+        schedule_export_parser.add_argument("schedules", nargs="+", metavar="schedule", help="schedule names")
+        schedule_export_parser.add_argument("--since", metavar="date", help="start of the range (default: today)")
+        schedule_export_parser.add_argument("--until", metavar="date", help="end of the range (default: 4 weeks after --since)")
+        schedule_export_parser.add_argument("--format", "-f", choices=["csv", "ics"], help="csv, or ics for calendars (default: csv)")
+        schedule_export_parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY, metavar="n", help="number of schedule months to fetch at once (default: %(default)s)")
+
+        report_parser = subparsers.add_parser("report", help="Incident counts and time to ack/resolve, from the local store (see pd sync)")
+        report_parser.set_defaults(func=self.incident_report)
+        report_parser.add_argument("--since", metavar="date", help="only count incidents created since then")
+        report_parser.add_argument("--by", action="append", choices=["class", "summary", "service", "hour"], help="which breakdowns to show (default: all of them)")
+        report_parser.add_argument("--csv", help="print csv instead of tables, with times in seconds", action="store_true", default=False)
+
+        daemon_parser = subparsers.add_parser("daemon", help="Keep a warm client running in the background for other pd commands to use")
+        daemon_parser.set_defaults(func=self.daemon)
+        daemon_parser.add_argument("--interval", "-n", type=float, default=10, metavar="seconds", help="how often to catch up on open incidents (default: %(default)s)")
+
+        cache_parser = subparsers.add_parser("cache", help="Manage the local user/schedule lookup cache")
+        cache_subparsers = cache_parser.add_subparsers(dest="cache_cmd")
 
-        args = parser.parse_args()
+        cache_clear_parser = cache_subparsers.add_parser("clear", help="Forget all cached lookups")
+        cache_clear_parser.set_defaults(func=self.cache_clear)
+
+        cache_refresh_parser = cache_subparsers.add_parser("refresh", help="Re-fetch all cached lookups from pagerduty")
+        cache_refresh_parser.set_defaults(func=self.cache_refresh)
+
+        cache_stats_parser = cache_subparsers.add_parser("stats", help="Show how often cached api responses were used")
+        cache_stats_parser.set_defaults(func=self.cache_stats, records=True)
+
+        for batch_parser in [ack_parser, snooze_parser, resolve_parser]:
+            batch_parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY, metavar="n", help="number of incidents to work on at once (default: %(default)s)")
+            batch_parser.add_argument("--async", dest="use_async", help="send per-incident requests from one asyncio event loop instead of threads (needs aiohttp)", action="store_true", default=False)
+            batch_parser.add_argument("--yes", "-y", help="don't ask before acting on --class/--match", action="store_true", default=False)
+            select_group = batch_parser.add_mutually_exclusive_group()
+            select_group.add_argument("--class", dest="klass", metavar="summary", help="act on all your incidents with this summary (as shown by summary -s) or class")
+            select_group.add_argument("--match", metavar="pattern", help="act on all your incidents whose summary fuzzy matches pattern")
+
+
+        args = parser.parse_args(argv)
 
         if 'func' not in args:
             parser.print_help()
             sys.exit(1)
 
-        args.func(args)
+        if args.output != "text" and not getattr(args, "records", False):
+            print("--output {} only works with commands that print records".format(args.output))
+            sys.exit(2)
+        if args.output != "text" and getattr(args, "format", None):
+            print("--format and --output can't be used together")
+            sys.exit(2)
+
+        if args.profile or args.profile_json:
+            from .instrument import Instrumentation
+            self.instrumentation = Instrumentation()
+
+        self.output = Output(args.output) if args.output != "text" else None
+
+        try:
+            args.func(args)
+        finally:
+            if self.output:
+                self.output.close()
+            if args.profile:
+                self.instrumentation.report()
+            if args.profile_json:
+                self.instrumentation.dump(args.profile_json)
+
+    def daemon(self, args):
+        from .daemon import Daemon
+        Daemon(self.client, interval = args.interval).serve()
 
     def summary(self, args):
         if args.show_all:
@@ -101,64 +198,305 @@ class Cli():
             user_id = self.client.user(userquery).id
 
         if args.show_short and not args.show_all:
-            summary = self.client.summary(user_id, triggered=args.triggered)
+            if args.offline:
+                from .pagerduty import group_by_summary
+                summary = group_by_summary(self.store.incidents(self.client, user_id, triggered=args.triggered), cluster=args.cluster)
+            else:
+                summary = self.client.summary(user_id, triggered=args.triggered, cluster=args.cluster)
 
             keys = list(summary.keys())
             keys.sort()
 
-            for key in keys:
-                items = summary[key]
+            with self.client.timer("rendering"):
+                for key in keys:
+                    items = summary[key]
+
+                    if self.output:
+                        self.output.write({
+                            "summary": key,
+                            "type": items[0].type,
+                            "incidents": [incident.id for incident in items],
+                        })
+                        continue
+
+                    incident_numbers = []
+                    for incident in items:
+                        incident_numbers.append(
+                            str(status_color(incident.status)(str(incident.id), bold=True))
+                        )
+
+                    print("[{incidents}] {title}".format(
+                        incidents = ", ".join(incident_numbers),
+                        title = key,
+                    ))
 
-                incident_numbers = []
-                for incident in items:
-                    incident_numbers.append(
-                        str(status_colors[incident.status](incident.id, bold=True))
-                    )
+        else:
+            if args.offline:
+                incidents = self.store.incidents(self.client, user_id, triggered=args.triggered)
+            else:
+                incidents = self.client.incidents(user_id = user_id, triggered=args.triggered)
+
+            if self.output:
+                from .paginate import pages
+                for page in pages(incidents):
+                    # dedup keys of incidents without an incident key come from their alerts
+                    self.client.prefetch_alerts(incident for incident in page if not incident.incident_key)
+                    for incident in page:
+                        with self.client.timer("rendering"):
+                            self.output.write(incident.dict(show_user=args.show_all))
+                return
+
+            for incident in incidents:
+                with self.client.timer("rendering"):
+                    print(self.incident_line(args, incident))
+
+    def incident_line(self, args, incident):
+        output_str = "{number} {date} {title}"
+        if args.show_all:
+            output_str += " ({owner})"
+        if args.show_long:
+            output_str += "\n\t{url}\n"
+
+        color = status_color(incident.status)
+        return output_str.format(
+            number = color("[{}]".format(incident.id)),
+            date = color(incident.date),
+            title = incident.raw_summary,
+            url = incident.url,
+            owner = incident.assignee,
+        )
+
+    def watch(self, args):
+        import time
+        from .watch import ADDED, CHANGED, Watcher
 
-                print("[{incidents}] {title}".format(
-                    incidents = ", ".join(incident_numbers),
-                    title = key,
-                ))
+        if args.show_all:
+            user_id = None
+        else:
+            user_id = self.client.user(args.user or self.client.email).id
+
+        watcher = Watcher(self.client, user_id = user_id, triggered = args.triggered)
+        for incident in watcher.start():
+            print(self.incident_line(args, incident))
+        # piped output is block buffered, and this never finishes
+        sys.stdout.flush()
+
+        markers = {ADDED: "+", CHANGED: "~"}
+        try:
+            while True:
+                time.sleep(args.interval)
+                for change, incident in watcher.poll():
+                    with self.client.timer("rendering"):
+                        print("{} {}".format(markers.get(change, "-"), self.incident_line(args, incident)), flush=True)
+        except KeyboardInterrupt:
+            pass
 
+    @property
+    def messages(self):
+        """Where to print anything that isn't a record, so it stays out of --output json."""
+        return sys.stderr if self.output else sys.stdout
+
+    def report(self, results):
+        failed = 0
+        for label, result, error in results:
+            if error:
+                failed += 1
+
+            if self.output:
+                self.output.write({"id": str(label), "result": result, "error": str(error) if error else None})
+            elif error:
+                print("{}: {}".format(label, error))
+            elif result:
+                print(result)
+
+        if failed:
+            sys.exit(2)
+
+    def fan_out(self, args, action, ids, *extra):
+        """Call client.<action>(id, *extra) for every id.
+
+        Runs on a thread pool, or with --async on a single event loop, and
+        gives back (id, result, error) in the order of `ids`.
+        """
+        if not args.use_async:
+            return run_all(lambda _id: getattr(self.client, action)(_id, *extra), ids, args.concurrency)
+
+        import asyncio
+        try:
+            from .async_pagerduty import AsyncPagerduty
+        except ImportError:
+            print("--async needs aiohttp to be installed")
+            sys.exit(2)
+
+        async def run():
+            async with AsyncPagerduty.from_config(max_connections=args.concurrency) as client:
+                return await asyncio.gather(
+                    *(getattr(client, action)(_id, *extra) for _id in ids),
+                    return_exceptions=True,
+                )
+
+        results = asyncio.run(run()) if ids else []
+        return [
+            (_id, None, result) if isinstance(result, Exception) else (_id, result, None)
+            for _id, result in zip(ids, results)
+        ]
+
+    def selecting(self, args):
+        if args.klass or args.match:
+            return True
+
+        if not args.ids:
+            print("Give some incident IDs, --class or --match")
+            sys.exit(2)
+        return False
+
+    def select(self, args, status = None):
+        """Find your open incidents picked out by --class or --match.
+
+        Everything comes from a single listing; the matches are shown and
+        confirmed before anything is done to them.
+        """
+        summary = self.client.summary(self.client.me.id)
+
+        if args.klass:
+            keys = [key for key, items in summary.items() if args.klass in [key, items[0].type]]
         else:
-            incidents = self.client.incidents(user_id = user_id, triggered=args.triggered)
+            from .search import SummaryIndex
+            keys = SummaryIndex(summary.keys()).search(args.match)
+        keys.sort()
+
+        incidents = []
+        for key in keys:
+            items = [incident for incident in summary[key] if status is None or incident.status == status]
+            if not items:
+                continue
+
+            incidents.extend(items)
+            print("[{incidents}] {title}".format(
+                incidents = ", ".join(str(status_color(i.status)(str(i.id), bold=True)) for i in items),
+                title = key,
+            ), file=self.messages)
+
+        if not incidents:
+            print("No matching incidents", file=self.messages)
+            sys.exit(1)
 
-            output_str = "{number} {date} {title}"
-            if args.show_all:
-                output_str += " ({owner})"
-            if args.show_long:
-                output_str += "\n\t{url}\n"
+        if not args.yes:
+            # input() would put the question in with the json
+            print("Act on these {} incidents [yN]? ".format(len(incidents)), end="", file=self.messages, flush=True)
+            correct = input()
+            if not correct or correct[0] not in ["y", "Y"]:
+                sys.exit(1)
 
-            for incident in incidents:
-                color = status_colors[incident.status]
-                print(output_str.format(
-                    number = color("[{}]".format(incident.id)),
-                    date = color(incident.date),
-                    title = incident.raw_summary,
-                    url = incident.url,
-                    owner = incident.assignee,
-                ))
+        return incidents
+
+    def set_status(self, incidents, status):
+        verb = "acking" if status == "acknowledged" else "resolving"
+        errors = self.client.bulk_update([incident.raw_id for incident in incidents], status=status)
+        return [
+            (incident.id, "{} {}".format(verb, incident.summary), errors[incident.raw_id])
+            for incident in incidents
+        ]
 
     def snooze(self, args):
         delta = duration_seconds(args.duration)
         if delta > self.client.MAX_SNOOZE_DURATION:
             print("{} is too long, maximum snooze duration is 7 days".format(args.duration))
-            os.exit(2)
+            sys.exit(2)
 
-        for _id in args.ids:
-            self.client.snooze(_id, delta)
+        if not self.selecting(args):
+            self.report(self.fan_out(args, "snooze", args.ids, delta))
+            return
+
+        incidents = self.select(args)
+
+        # snoozing needs the incident acked first, which can at least be done in bulk
+        triggered = [incident for incident in incidents if incident.status == "triggered"]
+        results = {}
+        for _id, _, error in self.set_status(triggered, "acknowledged"):
+            if error:
+                results[_id] = (None, error)
+
+        pending = [incident for incident in incidents if incident.id not in results]
+        for incident, result, error in run_all(lambda i: i.snooze(self.client.email, delta), pending, args.concurrency):
+            results[incident.id] = (result, error)
+
+        self.report((incident.id,) + results[incident.id] for incident in incidents)
 
     def ack(self, args):
-        for _id in args.ids:
-            self.client.ack(_id)
+        if self.selecting(args):
+            self.report(self.set_status(self.select(args, status="triggered"), "acknowledged"))
+        else:
+            self.update_status(args, "acknowledged", "ack")
+
+    def update_status(self, args, status, fallback):
+        """Set the status of many incidents at once.
+
+        The incidents are fetched directly (concurrently) to check their
+        status, and the ones that can change are updated in bulk. With --async
+        each goes through the client's `fallback` method instead.
+        """
+        ids = list(dict.fromkeys(args.ids))
+        if args.use_async:
+            self.report(self.fan_out(args, fallback, ids))
+            return
+
+        results = {}
+        ready = []
+        for _id, incident, error in run_all(self.client.show, ids, args.concurrency):
+            if error:
+                results[_id] = (None, error)
+            elif status == "acknowledged" and incident.status != "triggered":
+                results[_id] = (None, "Incident {} is not triggered".format(_id))
+            elif status == "resolved" and incident.status == "resolved":
+                results[_id] = ("Incident {} is already resolved".format(_id), None)
+            else:
+                ready.append((_id, incident))
+
+        updated = self.set_status([incident for _, incident in ready], status)
+        for (_id, _), (_, result, error) in zip(ready, updated):
+            results[_id] = (result, error)
+
+        self.report((_id,) + results[_id] for _id in ids)
 
     def show(self, args):
-        incident = self.client.show(args.id)
+        if args.offline:
+            incidents = ((_id, self.store.show(self.client, _id), None) for _id in args.ids)
+        else:
+            incidents = self.client.show_many(args.ids, args.concurrency)
 
-        # prime alerts, so printing happens quickly
-        incident.alerts
+        failed = False
+        for _id, incident, error in incidents:
+            if args.offline and incident is None:
+                error = "isn't in the local store, try pd sync"
 
-        color = status_colors[incident.status]
+            if error:
+                failed = True
+                print("{}: {}".format(_id, error), file=self.messages)
+            else:
+                self.show_incident(incident)
+
+        if failed:
+            sys.exit(2)
+
+    def show_incident(self, incident):
+        import crayons
+
+        if self.output:
+            record = incident.dict()
+            record.update({
+                "url": incident.url,
+                "user": incident.assignee,
+                "alerts": [{
+                    "alert_key": alert.alert_key,
+                    "details": alert.body.details,
+                    "contexts": [{"text": context.text, "href": context.href} for context in alert.contexts],
+                } for alert in incident.alerts],
+            })
+            self.output.write(record)
+            return
+
+        color = status_color(incident.status)
         print(color(incident.raw.summary, bold=True))
         print(indent(color("{status}\t{assignee}\t{dedup_key}\n{url}".format(
             status = incident.status,
@@ -177,24 +515,42 @@ class Cli():
                 print(indent(indent(indent(context.href))))
 
     def ackall(self, args):
-        for incident in self.client.incidents(user_id = self.client.me.id, triggered=True):
-            print("acking {}".format(incident.summary))
-            incident.acknowledge(self.client.email)
-        else:
-            print("You don't own any triggered incidents")
+        incidents = list(self.client.incidents(user_id = self.client.me.id, triggered=True))
+        if not incidents:
+            print("You don't own any triggered incidents", file=self.messages)
             sys.exit(1)
 
+        self.report(self.set_status(incidents, "acknowledged"))
+
     def assign(self, args):
         user = self.client.user(args.user)
         self.client.reassign(args.id, user)
 
 
     def resolve(self, args):
-        for _id in args.ids:
-            self.client.resolve(_id)
+        if self.selecting(args):
+            self.report(self.set_status(self.select(args), "resolved"))
+        else:
+            self.update_status(args, "resolved", "resolve")
 
     def who(self, args):
-        oncalls = self.client.oncalls()
+        from tabulate import tabulate
+
+        policy_ids = [self.client.escalation_policy(name).id for name in args.policy or []]
+        schedule_ids = [self.client.schedule(name).id for name in args.schedule or []]
+        oncalls = self.client.oncalls(policy_ids, schedule_ids, refresh=args.refresh)
+        if self.output:
+            for _, team in sorted(oncalls.items(), key=lambda item: item[1]["name"]):
+                self.output.write({
+                    "name": team["name"],
+                    "id": team["id"],
+                    "levels": [{"level": level["level"], "person": level["person"]} for level in team["levels"]],
+                })
+            return
+
+        if not oncalls:
+            print("Nobody is on call")
+            sys.exit(1)
 
         table = []
         for _, team in oncalls.items():
@@ -211,6 +567,9 @@ class Cli():
         print(tabulate(table, headers=header))
 
     def open(self, args):
+        from urllib.parse import urlparse
+        from webbrowser import open as webopen
+
         if args.id == -1:
             incident = self.client.show(1)
             url = urlparse(incident.url)
@@ -222,6 +581,8 @@ class Cli():
         webopen(page)
 
     def override(self, args):
+        import maya
+
         schedule = self.client.schedule(args.schedule)
         user = self.client.user(args.user)
 
@@ -246,3 +607,102 @@ class Cli():
 
         self.client.create_override(schedule.id, user.id, start, end)
 
+    def schedule_export(self, args):
+        from datetime import datetime, timedelta
+        from .schedule import to_csv, to_ics
+
+        if args.since:
+            since = parse_time(args.since)
+        else:
+            since = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+        until = parse_time(args.until) if args.until else since + timedelta(weeks=4)
+
+        if until <= since:
+            print("--until has to be after --since")
+            sys.exit(2)
+
+        schedules = [self.client.schedule(name) for name in args.schedules]
+        entries = self.client.schedule_entries(schedules, since, until, concurrency=args.concurrency)
+
+        if self.output:
+            for entry in entries:
+                self.output.write({
+                    "schedule_id": entry["schedule_id"],
+                    "schedule": entry["schedule"],
+                    "user_id": entry["user_id"],
+                    "user": entry["user"],
+                    "start": timestamp(entry["start"]),
+                    "end": timestamp(entry["end"]),
+                })
+        elif args.format == "ics":
+            sys.stdout.write(to_ics(entries))
+        else:
+            sys.stdout.write(to_csv(entries))
+
+    def sync(self, args):
+        since = None
+        if args.since:
+            since = timestamp(parse_time(args.since))
+
+        count = self.store.sync(self.client, since=since, concurrency=args.concurrency)
+        print("synced {} incidents to {}".format(count, self.store.path))
+
+    def incident_report(self, args):
+        from .report import CSV_HEADERS, GROUPS, HEADERS, Report, duration
+
+        since = parse_time(args.since) if args.since else None
+        report = Report(self.store, self.client.classifier, since=since)
+        groups = args.by or GROUPS
+
+        if args.csv:
+            import csv
+            writer = csv.writer(sys.stdout)
+            writer.writerow(CSV_HEADERS)
+            for group in [None] + groups:
+                for row in report.rows(group):
+                    writer.writerow([group or "all"] + row)
+            return
+
+        from tabulate import tabulate
+
+        def formatted(rows):
+            return [[key, count, acked, duration(ack), resolved, duration(resolve)] for key, count, acked, ack, resolved, resolve in rows]
+
+        print(tabulate(formatted(report.rows()), headers=[""] + HEADERS))
+        for group in groups:
+            print()
+            if group == "hour":
+                print(tabulate(report.hours(), headers=[""] + ["{:02d}".format(hour) for hour in range(24)]))
+            else:
+                print(tabulate(formatted(report.rows(group)), headers=[group] + HEADERS))
+
+    def cache_clear(self, args):
+        if self.client.cache:
+            self.client.cache.clear()
+        if self.client.response_cache:
+            self.client.response_cache.clear()
+
+    def cache_refresh(self, args):
+        self.client.refresh_cache()
+
+    def cache_stats(self, args):
+        from tabulate import tabulate
+
+        if not self.client.response_cache:
+            print("The response cache is turned off in pd.json")
+            sys.exit(2)
+
+        rows = []
+        for endpoint, stats in sorted(self.client.response_cache.stats().items()):
+            lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+            if self.output:
+                self.output.write(dict(stats, endpoint=endpoint))
+                continue
+
+            rows.append([
+                endpoint, stats["responses"], stats["bytes"], stats["hits"], stats["revalidated"], stats["misses"],
+                "{:.0%}".format((stats["hits"] + stats["revalidated"]) / lookups) if lookups else "",
+            ])
+
+        if not self.output:
+            print(tabulate(rows, headers=["endpoint", "responses", "bytes", "hits", "revalidated", "misses", "hit rate"]))
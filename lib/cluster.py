@@ -0,0 +1,156 @@
+import math
+import re
+
+# parts of titles that change from one alert to the next, most specific first
+VOLATILE = [
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I), "<uuid>"),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?"), "<time>"),
+    (re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?\b"), "<time>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<ip>"),
+    (re.compile(r"\b(?:0x)?(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{6,}\b", re.I), "<hex>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<n>"),
+]
+
+WILDCARD = "<*>"
+
+
+def normalize(title):
+    """The words of a title, with ids, addresses, times and numbers replaced by placeholders.
+
+    "Disk full on web-12 (10.0.0.3)" -> ("Disk", "full", "on", "web-<n>", "(<ip>)")
+    """
+    for pattern, placeholder in VOLATILE:
+        title = pattern.sub(placeholder, title)
+    return tuple(title.split())
+
+
+class Cluster():
+    __slots__ = ('template', 'title', 'titles', 'number')
+
+    def __init__(self, tokens, title, number = 0):
+        self.template = list(tokens)
+        # which cluster this is, oldest first, so ties always go the same way
+        self.number = number
+        # the first title seen, and how many different ones there have been
+        self.title = title
+        self.titles = 0
+
+    def similarity(self, tokens):
+        """The fraction of words the same as the template's, not counting its wildcards."""
+        same = 0
+        for mine, theirs in zip(self.template, tokens):
+            if mine == theirs and mine != WILDCARD:
+                same += 1
+        return same / len(tokens)
+
+    def merge(self, tokens):
+        for i, token in enumerate(tokens):
+            if self.template[i] != token:
+                self.template[i] = WILDCARD
+
+    @property
+    def name(self):
+        if self.titles == 1:
+            return self.title
+        return " ".join(self.template)
+
+
+class Clusterer():
+    """Groups titles that only differ in a few words, by mining templates from them.
+
+    Titles are normalized first, so ones differing only in ids or numbers come
+    out the same, and each different normalized title is only looked at once.
+    Those are compared against the templates with the same number of words
+    and first word, or failing that the same number of words; one close
+    enough (see SIMILARITY) takes them in, with the words that differ becoming
+    wildcards, otherwise they start a new template.
+
+    Templates are indexed on each word and its position, so a title is only
+    compared with the templates that share enough words to be close enough,
+    found from its rarest words. That keeps it close to linear in the number
+    of titles, even when most of them end up in templates of their own.
+    """
+
+    SIMILARITY = 0.5
+
+    def __init__(self, similarity = None):
+        self.similarity = similarity or Clusterer.SIMILARITY
+        self.groups = {}
+        self.postings = {}
+        self.normalized = {}
+        self.titles = {}
+        self.count = 0
+
+    def add(self, title):
+        """The Cluster for a title."""
+        cluster = self.titles.get(title)
+        if cluster is not None:
+            return cluster
+
+        tokens = normalize(title)
+        cluster = self.normalized.get(tokens)
+        if cluster is None:
+            cluster = self.normalized[tokens] = self._place(tokens, title)
+
+        self.titles[title] = cluster
+        cluster.titles += 1
+        return cluster
+
+    def candidates(self, tokens):
+        """Templates the same length as tokens that could be close enough to them, oldest first.
+
+        To be close enough a template has to have `needed` of the words in
+        the same places, so it has at least one of any len - needed + 1 of
+        them; those are picked from the words fewest templates have. Templates
+        only ever lose words to wildcards, so the index can be out of date
+        but never misses one.
+        """
+        needed = max(1, math.ceil(self.similarity * len(tokens)))
+        postings = sorted(
+            (self.postings.get((len(tokens), i, token), ()) for i, token in enumerate(tokens)),
+            key = len,
+        )
+
+        found = {}
+        for clusters in postings[:len(tokens) - needed + 1]:
+            for cluster in clusters:
+                found[cluster.number] = cluster
+        return [found[number] for number in sorted(found)]
+
+    def closest(self, clusters, tokens):
+        best, best_similarity = None, 0
+        for cluster in clusters:
+            similarity = cluster.similarity(tokens)
+            if similarity > best_similarity:
+                best, best_similarity = cluster, similarity
+
+        if best_similarity >= self.similarity:
+            return best
+        return None
+
+    def _place(self, tokens, title):
+        if not tokens:
+            return Cluster(tokens, title)
+
+        candidates = self.candidates(tokens)
+        group = self.groups.setdefault((len(tokens), tokens[0]), set())
+
+        cluster = self.closest([candidate for candidate in candidates if candidate.number in group], tokens)
+        if cluster is None:
+            # titles that start with a hostname or the like; once one is
+            # found this way, others starting with the same word find it
+            # straight away
+            cluster = self.closest(candidates, tokens)
+            if cluster is not None:
+                group.add(cluster.number)
+
+        if cluster is not None:
+            cluster.merge(tokens)
+            return cluster
+
+        self.count += 1
+        cluster = Cluster(tokens, title, self.count)
+        group.add(cluster.number)
+        for i, token in enumerate(tokens):
+            self.postings.setdefault((len(tokens), i, token), []).append(cluster)
+        return cluster
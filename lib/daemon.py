@@ -0,0 +1,398 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+
+# this module is imported by every pd run, to see if there's a daemon to hand
+# the command to, so it only loads socket once that's worth doing
+
+# commands the daemon runs; the rest (long running, or needing the caller's
+# desktop) always run in the pd process itself
+FORWARDED = ["summary", "show", "who", "ack", "snooze", "resolve", "ackall", "assign", "override", "report", "schedule", "cache"]
+
+# environment that changes what pd prints; commands are only run by a daemon
+# started with the same, since it can't be changed for one thread
+ENVIRONMENT = ["TZ", "LANG", "LC_ALL", "LC_CTYPE", "LC_TIME"]
+
+# the daemon's reply when the command should run in the pd that sent it
+REFUSED = "-"
+
+
+def environment():
+    return {name: os.environ.get(name) for name in ENVIRONMENT}
+
+
+def socket_path():
+    return os.path.join(os.path.expanduser('~'), '.config', 'pd.sock')
+
+
+def forwardable(argv):
+    """Whether pd's arguments are for a command the daemon runs.
+
+    Worked out without argparse (or importing the rest of pd), as it's done
+    before anything else on every run. Anything unusual runs in-process.
+    """
+    args = iter(argv)
+    for arg in args:
+        if arg in ["--output", "-o"]:
+            next(args, None)
+        elif arg.startswith("--output=") or arg.startswith("-o"):
+            continue
+        elif arg.startswith("-"):
+            # --profile needs the instrumented client in this process
+            return False
+        else:
+            return arg in FORWARDED
+    return False
+
+
+def connect(path = None):
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path or socket_path()))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def running(path = None):
+    sock = connect(path)
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def forward(argv, path = None):
+    """Run a pd command in the daemon, if there is one.
+
+    The daemon is handed our stdin, stdout and stderr, so it prints (and asks
+    questions) straight to the terminal, and runs the command in our working
+    directory. Gives back the command's exit code, or None when no daemon is
+    listening or it was started with a different environment.
+    """
+    import json
+    import socket
+
+    sock = connect(path)
+    if sock is None:
+        return None
+
+    message = {"argv": argv, "cwd": os.getcwd(), "env": environment()}
+    with sock:
+        try:
+            socket.send_fds(sock, [json.dumps(message).encode()], [0, 1, 2])
+            reply = sock.makefile().read()
+        except KeyboardInterrupt:
+            # closing the socket tells the daemon to give up on the command
+            print(file=sys.stderr)
+            return 130
+
+    if not reply:
+        print("pd daemon went away while running the command", file=sys.stderr)
+        return 1
+    if reply == REFUSED:
+        return None
+    return int(reply)
+
+
+class ThreadStream():
+    """Stands in for sys.stdout and friends, so that each of the daemon's
+    threads can print to the terminal of the pd that sent its command."""
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    @property
+    def stream(self):
+        return getattr(self.local, 'stream', self.default)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def __iter__(self):
+        return iter(self.stream)
+
+
+class Command():
+    """A command the daemon is running for a pd, interrupted (as if with ^C)
+    if that pd goes away before it's done, eg. because ^C was pressed there."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.thread = threading.get_ident()
+        self.lock = threading.Lock()
+        self.done = False
+        threading.Thread(target = self.watch, daemon = True).start()
+
+    def watch(self):
+        import ctypes
+
+        # pd sends nothing after the command, so this only returns once it
+        # has gone, or once finish() has shut the socket for reading
+        try:
+            self.sock.recv(1)
+        except OSError:
+            pass
+
+        if self.cancel():
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.thread), ctypes.py_object(KeyboardInterrupt))
+
+    def cancel(self):
+        """Whether the command still has to be interrupted; only true once."""
+        with self.lock:
+            cancelled, self.done = not self.done, True
+            return cancelled
+
+    def finish(self):
+        import socket
+
+        with self.lock:
+            self.done = True
+        try:
+            self.sock.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+
+
+class Stdin():
+    """The stdin of the pd that sent a command. Waiting on a terminal for an
+    answer is interrupted if that pd goes away; the answer is for the shell now."""
+
+    def __init__(self, file, command):
+        self.file = file
+        self.command = command
+
+    def readline(self, *args):
+        if self.file.isatty():
+            import select
+
+            while self.file not in select.select([self.file, self.command.sock], [], [])[0]:
+                if self.command.cancel():
+                    raise KeyboardInterrupt
+        return self.file.readline(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+
+class OpenIncidents():
+    """Every open incident, kept up to date for the daemon's commands.
+
+    A Watcher lists them once, then catches up from the log entries every
+    `interval` seconds in the background, and again before each command
+    uses them, so answers are never staler than that one request. If
+    catching up fails the next use lists everything again.
+    """
+
+    def __init__(self, client, interval):
+        from .watch import Watcher
+
+        self.watcher = Watcher(client)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stale = True
+
+    def start(self):
+        self.update()
+        threading.Thread(target = self.refresh, daemon = True).start()
+
+    def refresh(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.update()
+            except Exception as e:
+                print("couldn't refresh open incidents: {}".format(e), file=sys.__stderr__)
+
+    def update(self):
+        with self.lock:
+            try:
+                if self.stale:
+                    self.watcher.start()
+                    self.stale = False
+                else:
+                    self.watcher.poll()
+            except Exception:
+                self.stale = True
+                raise
+            return list(self.watcher.incidents.values())
+
+    def incidents(self, user_id = None, triggered = False):
+        statuses = ["triggered"] if triggered else ["triggered", "acknowledged"]
+        incidents = [
+            incident for incident in self.update()
+            if incident.status in statuses and (user_id is None or user_id in incident.assignee_ids)
+        ]
+        incidents.sort(key = lambda incident: incident.id)
+        return incidents
+
+
+class Daemon():
+    """Runs pd commands sent over a unix socket, with one warm client.
+
+    Python's startup, the imports, reading the config, building the client and
+    looking up who you are all happen once, and connections, cached lookups
+    and the set of open incidents stay warm between commands.
+    """
+
+    def __init__(self, client, path = None, interval = 10):
+        from pathlib import Path
+
+        self.client = client
+        self.path = Path(path or socket_path())
+        self.open_incidents = OpenIncidents(client, interval)
+        self.environment = environment()
+        # commands run in the caller's directory; the working directory is
+        # shared by every thread, so only commands from the same one overlap
+        self.directory = threading.Condition()
+        self.running = 0
+
+    def serve(self):
+        import signal
+        import socketserver
+        import tempfile
+
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                daemon.handle(self.request)
+
+        if self.path.is_socket():
+            if running(self.path):
+                print("pd daemon is already running on {}".format(self.path))
+                sys.exit(2)
+            # left behind by a daemon that didn't shut down cleanly
+            self.path.unlink()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.client.me
+        self.open_incidents.start()
+        self.client.live_incidents = self.open_incidents
+
+        # anyone who can connect can act as you, so only you can: the socket
+        # is made in a directory only you can get into, and moved into place
+        # once nobody else can use it
+        private = tempfile.mkdtemp(dir=str(self.path.parent))
+        try:
+            server = socketserver.ThreadingUnixStreamServer(os.path.join(private, "pd.sock"), Handler)
+            os.chmod(server.server_address, 0o600)
+            os.rename(server.server_address, str(self.path))
+        finally:
+            if os.path.exists(os.path.join(private, "pd.sock")):
+                os.unlink(os.path.join(private, "pd.sock"))
+            os.rmdir(private)
+        server.daemon_threads = True
+
+        sys.stdin = ThreadStream(sys.stdin)
+        sys.stdout = ThreadStream(sys.stdout)
+        sys.stderr = ThreadStream(sys.stderr)
+
+        # clean up the socket when killed, not just on ^C
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+        print("pd daemon listening on {}".format(self.path), file=sys.__stderr__)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.path.unlink()
+
+    def handle(self, sock):
+        import json
+        import socket
+
+        message, fds, _, _ = socket.recv_fds(sock, 65536, 3)
+        if len(fds) != 3:
+            # not a command, eg. running() checking we're here
+            for fd in fds:
+                os.close(fd)
+            return
+
+        message = json.loads(message.decode())
+        if message["env"] != self.environment:
+            for fd in fds:
+                os.close(fd)
+            sock.sendall(REFUSED.encode())
+            return
+
+        command = Command(sock)
+        stdin = Stdin(open(fds[0], closefd=True), command)
+        stdout = open(fds[1], 'w', closefd=True)
+        stderr = open(fds[2], 'w', closefd=True)
+        for stream, redirect in [(sys.stdin, stdin), (sys.stdout, stdout), (sys.stderr, stderr)]:
+            stream.local.stream = redirect
+
+        try:
+            try:
+                with self.cwd(message["cwd"]):
+                    code = self.run(message["argv"])
+            finally:
+                command.finish()
+        except KeyboardInterrupt:
+            # the pd that sent it has gone, so there's nobody to answer
+            code = None
+        finally:
+            for stream in [sys.stdin, sys.stdout, sys.stderr]:
+                del stream.local.stream
+            for redirect in [stdout, stderr]:
+                try:
+                    redirect.flush()
+                except OSError:
+                    pass
+            for redirect in [stdin, stdout, stderr]:
+                try:
+                    redirect.close()
+                except OSError:
+                    pass
+
+        if code is not None:
+            sock.sendall(str(code).encode())
+
+    @contextlib.contextmanager
+    def cwd(self, path):
+        """Run in the given working directory, waiting for commands running elsewhere to finish."""
+        with self.directory:
+            while self.running and os.getcwd() != path:
+                self.directory.wait()
+            os.chdir(path)
+            self.running += 1
+        try:
+            yield
+        finally:
+            with self.directory:
+                self.running -= 1
+                self.directory.notify_all()
+
+    def run(self, argv):
+        from .cli import Cli
+
+        cli = Cli()
+        cli._pd_client = self.client
+        try:
+            cli.main(argv)
+        except BrokenPipeError:
+            # eg. piped into head, which has stopped reading
+            return 1
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            print(e.code, file=sys.stderr)
+            return 1
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            return 1
+        return 0
+
@@ -0,0 +1,215 @@
+import json
+import re
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+
+# upper bounds (in milliseconds) of the latency histogram buckets
+BUCKETS = [50, 100, 250, 500, 1000, 2500, None]
+
+ID_PATTERN = re.compile(r'(?<=/)[A-Z0-9]+(?=/|$)')
+
+
+def endpoint_name(method, path):
+    """GET incidents/PABC123/alerts -> GET incidents/{id}/alerts"""
+    return "{} {}".format(method.upper(), ID_PATTERN.sub("{id}", path.strip("/")))
+
+
+class Endpoint():
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0
+        self.slowest = 0
+        self.bytes = 0
+        self.pages = 0
+        self.histogram = [0] * len(BUCKETS)
+
+    def record(self, seconds, size, page, error):
+        self.calls += 1
+        self.errors += 1 if error else 0
+        self.seconds += seconds
+        self.slowest = max(self.slowest, seconds)
+        self.bytes += size
+        self.pages = max(self.pages, page)
+
+        ms = seconds * 1000
+        for i, bound in enumerate(BUCKETS):
+            if bound is None or ms <= bound:
+                self.histogram[i] += 1
+                break
+
+    def dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "seconds": self.seconds,
+            "mean_ms": self.seconds / self.calls * 1000 if self.calls else 0,
+            "slowest_ms": self.slowest * 1000,
+            "bytes": self.bytes,
+            "pagination_depth": self.pages,
+            "histogram_ms": {
+                "<={}".format(bound) if bound else ">{}".format(BUCKETS[-2]): count
+                for bound, count in zip(BUCKETS, self.histogram)
+            },
+        }
+
+
+class Instrumentation():
+    """Records what a Pagerduty client spends its time on.
+
+    `wrap` hooks into a pygerduty client so every request is timed and sized
+    per endpoint; `timer` measures named chunks of local work, like building
+    Incident objects. Requests are timed underneath the RequestScheduler, so
+    each attempt counts as a call, and waiting for the rate limit is shown on
+    its own rather than as latency.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.endpoints = {}
+        self.timers = {}
+        self.scheduler = None
+        self.response_cache = None
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        # wall time with at least one request in flight; requests overlap, so
+        # adding up their times can come to more than the wall time
+        self.in_flight = 0
+        self.busy_since = 0
+        self.busy = 0
+
+    def wrap(self, pager, scheduler = None):
+        request = scheduler.send if scheduler else pager.request
+        opener = pager.requester.opener
+        open_url = opener.open
+
+        def counting_open(*args, **kwargs):
+            response = open_url(*args, **kwargs)
+            read = response.read
+
+            def counting_read(*read_args):
+                data = read(*read_args)
+                self.local.size = getattr(self.local, 'size', 0) + len(data)
+                return data
+
+            response.read = counting_read
+            return response
+
+        def instrumented_request(method, path, query_params=None, data=None, extra_headers=None):
+            self.local.size = 0
+            page = 0
+            if query_params and 'offset' in query_params and query_params.get('limit'):
+                page = int(query_params['offset']) // int(query_params['limit']) + 1
+
+            error = False
+            start = self.started_request()
+            try:
+                return request(method, path, query_params=query_params, data=data, extra_headers=extra_headers)
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.record(endpoint_name(method, path), self.finished_request() - start, self.local.size, page, error)
+
+        opener.open = counting_open
+        if scheduler:
+            scheduler.send = instrumented_request
+        else:
+            pager.request = instrumented_request
+
+    def started_request(self):
+        now = time.perf_counter()
+        with self.lock:
+            if self.in_flight == 0:
+                self.busy_since = now
+            self.in_flight += 1
+        return now
+
+    def finished_request(self):
+        now = time.perf_counter()
+        with self.lock:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.busy += now - self.busy_since
+        return now
+
+    def record(self, name, seconds, size, page, error):
+        with self.lock:
+            if name not in self.endpoints:
+                self.endpoints[name] = Endpoint(name)
+            self.endpoints[name].record(seconds, size, page, error)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.timers[name] = self.timers.get(name, 0) + elapsed
+
+    def dict(self):
+        wall = time.perf_counter() - self.started
+        requests = sum(endpoint.seconds for endpoint in self.endpoints.values())
+        timed = sum(self.timers.values())
+        with self.lock:
+            busy = self.busy
+
+        return {
+            "wall_seconds": wall,
+            "cpu_seconds": time.process_time() - self.cpu_started,
+            "request_seconds": requests,
+            "waiting_on_requests_seconds": busy,
+            "requests": sum(endpoint.calls for endpoint in self.endpoints.values()),
+            "bytes": sum(endpoint.bytes for endpoint in self.endpoints.values()),
+            "timers": dict(self.timers, **{"waiting on requests": busy, "other": max(0, wall - busy - timed)}),
+            "endpoints": {name: endpoint.dict() for name, endpoint in sorted(self.endpoints.items())},
+            "scheduler": self.scheduler.stats() if self.scheduler else None,
+            "response_cache": dict(self.response_cache.counts) if self.response_cache else None,
+        }
+
+    def report(self, out = sys.stderr):
+        stats = self.dict()
+
+        print("", file=out)
+        print("{:.3f}s wall, {:.3f}s cpu, {} requests ({:.3f}s), {} bytes".format(
+            stats["wall_seconds"], stats["cpu_seconds"], stats["requests"], stats["request_seconds"], stats["bytes"],
+        ), file=out)
+
+        print("", file=out)
+        print("{:<32} {:>6} {:>9} {:>9} {:>10} {:>6}".format("endpoint", "calls", "mean ms", "max ms", "bytes", "pages"), file=out)
+        for name, endpoint in stats["endpoints"].items():
+            print("{:<32} {:>6} {:>9.1f} {:>9.1f} {:>10} {:>6}".format(
+                name, endpoint["calls"], endpoint["mean_ms"], endpoint["slowest_ms"], endpoint["bytes"], endpoint["pagination_depth"],
+            ), file=out)
+
+        print("", file=out)
+        for name, seconds in stats["timers"].items():
+            print("{:<32} {:>9.3f}s".format(name, seconds), file=out)
+
+        scheduler = stats["scheduler"]
+        if scheduler:
+            print("", file=out)
+            print("rate limited {} times, {} retries, concurrency limit {}".format(
+                scheduler["throttled"], scheduler["retries"], scheduler["concurrency_limit"],
+            ), file=out)
+            # added up across threads, like the request times above
+            for name, key in [("waiting for tokens", "seconds_waiting_for_tokens"), ("waiting for a free slot", "seconds_waiting_for_slots"), ("backing off", "seconds_backing_off")]:
+                print("{:<32} {:>9.3f}s".format(name, scheduler[key]), file=out)
+
+        cached = stats["response_cache"]
+        if cached and any(cached.values()):
+            print("", file=out)
+            print("response cache: {} hits, {} revalidated, {} misses".format(
+                cached["hits"], cached["revalidated"], cached["misses"],
+            ), file=out)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.dict(), f, indent=4)
@@ -0,0 +1,33 @@
+import json
+import sys
+
+FORMATS = ["text", "json", "ndjson"]
+
+
+class Output():
+    """Writes records out as soon as they're ready, for --output json/ndjson.
+
+    ndjson is one object per line. json is a single array, but it's still
+    written an element at a time rather than built up in memory first.
+    """
+
+    def __init__(self, format, out = None):
+        self.format = format
+        self.out = out or sys.stdout
+        self.count = 0
+
+    def write(self, record):
+        line = json.dumps(record, default=str)
+        if self.format == "json":
+            line = ("[" if self.count == 0 else ",") + "\n" + line
+        else:
+            line += "\n"
+
+        self.out.write(line)
+        self.out.flush()
+        self.count += 1
+
+    def close(self):
+        if self.format == "json":
+            self.out.write("[]\n" if self.count == 0 else "\n]\n")
+            self.out.flush()
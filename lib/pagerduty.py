@@ -1,31 +1,169 @@
 import json
-import maya
-import parse
 import pygerduty.v2
 import sys
-import tzlocal
-
+import time
+
+from contextlib import contextmanager
+from .cache import Cache, ResponseCache
+from .classify import DEFAULT_RULES, Classifier
+from .paginate import paginate
+from .scheduler import DEFAULT_RATE_LIMIT, RequestScheduler
+from .transport import TRANSPORTS, CachingOpener, PooledRequester
+from .utils import DEFAULT_CONCURRENCY, parse_time, run_all, timestamp
 from pathlib import Path
+from pygerduty.exceptions import NotFound
+
+class ActionError(Exception):
+    pass
+
+def read_config():
+    config_file = Path.home() / '.config' / 'pd.json'
+    if not config_file.is_file():
+        raise Exception("No config file found at $HOME/.config/pd.json.")
+
+    with config_file.open() as f:
+        return json.load(f)
+
+def client_options(conf):
+    """Arguments shared by Pagerduty and AsyncPagerduty, from the config file."""
+    cache = None
+    if conf.get('cache', True):
+        cache = Cache(ttls = conf.get('cache_ttl'))
+
+    return {
+        "api_key": conf['api_key'],
+        "email": conf['email'],
+        "cache": cache,
+        "classifier": Classifier(conf.get('classifications', []) + DEFAULT_RULES),
+        "api_base": conf.get('api_base'),
+        "timeout": conf.get('timeout', 10),
+        "retries": conf.get('retries', 2),
+        "rate_limit": conf.get('rate_limit', DEFAULT_RATE_LIMIT),
+    }
+
+def group_oncalls(raw_policies):
+    policies = {}
+
+    for policy in raw_policies:
+        policy_id = policy.escalation_policy.id
+        if policy_id not in policies:
+            policies[policy_id] = {
+                "name": policy.escalation_policy.summary,
+                "id": policy_id,
+                "levels": []
+            }
+
+        policies[policy_id]["levels"].append({
+            "level": policy.escalation_level,
+            "policy_name": policy.escalation_policy.summary,
+            "person": policy.user.summary,
+        })
+
+    for _, policy in policies.items():
+        policy["levels"].sort(key=lambda x: x['level'])
+
+    return policies
+
+def until_handoff(raw_oncalls):
+    """Seconds until the first of these oncall shifts ends, or None if none of them do."""
+    ends = [parse_time(oncall.end).timestamp() for oncall in raw_oncalls if getattr(oncall, 'end', None)]
+    if not ends:
+        return None
+    return min(ends) - time.time()
+
+def group_by_summary(incidents, cluster = False):
+    """Incidents by summary. With `cluster`, unclassified incidents whose
+    titles only differ in a few words share one (see cluster.Clusterer)."""
+    if cluster:
+        return group_by_cluster(incidents)
+
+    by_class = {}
+    for incident in incidents:
+        if incident.summary in by_class:
+            by_class[incident.summary].append(incident)
+        else:
+            by_class[incident.summary] = [incident]
+
+    return by_class
+
+def group_by_cluster(incidents):
+    from .cluster import Clusterer
+
+    clusterer = Clusterer()
+    groups = {}
+    for incident in incidents:
+        key = incident.summary
+        if incident.type is None:
+            # a cluster's name can still change as titles are added to it
+            key = clusterer.add(incident.title)
+        groups.setdefault(key, []).append(incident)
+
+    by_class = {}
+    for key, grouped in groups.items():
+        name = key if isinstance(key, str) else key.name
+        by_class.setdefault(name, []).extend(grouped)
+
+    return by_class
 
 class Pagerduty():
     MAX_SNOOZE_DURATION = 7 * 24 * 60 * 60
+    # most incidents PUT /incidents will accept in one request
+    BULK_UPDATE_SIZE = 250
 
     @classmethod
     def from_config(cls):
-        config_file = Path.home() / '.config' / 'pd.json'
-        if not config_file.is_file():
-            raise Exception("No config file found at $HOME/.config/pd.json.")
+        conf = read_config()
+
+        response_cache = None
+        if conf.get('response_cache', True):
+            response_cache = ResponseCache(ttls = conf.get('response_cache_ttl'), max_bytes = conf.get('response_cache_size'))
+
+        return cls(transport = conf.get('transport', 'pooled'), response_cache = response_cache, **client_options(conf))
+
+    def __init__(self, api_key, email, cache = None, classifier = None, api_base = None, transport = 'pooled', timeout = 10, retries = 2, rate_limit = DEFAULT_RATE_LIMIT, response_cache = None):
+        self.pager = pygerduty.v2.PagerDuty(api_key, timeout = timeout)
+        if api_base:
+            # pygerduty has no option for this; used to point pd at bench/server.py
+            self.pager._api_base = api_base
 
-        with config_file.open() as f:
-            conf = json.load(f)
-        api_key = conf['api_key']
-        email = conf['email']
+        if transport == 'pooled':
+            self.pager.requester = PooledRequester(timeout = timeout, retries = retries)
+        elif transport != 'urllib':
+            raise Exception("Unknown transport \"{}\", must be one of {}".format(transport, ", ".join(TRANSPORTS)))
 
-        return cls(api_key, email)
+        self.response_cache = response_cache
+        if response_cache:
+            self.pager.requester.opener = CachingOpener(self.pager.requester.opener, response_cache, self.pager._api_base)
+
+        # everything goes through the scheduler, so concurrent callers share the rate limit
+        self.scheduler = RequestScheduler(rate_limit = rate_limit)
+        self.scheduler.wrap(self.pager)
 
-    def __init__(self, api_key, email):
-        self.pager = pygerduty.v2.PagerDuty(api_key)
         self.email = email
+        self.cache = cache
+        self.classifier = classifier or Classifier()
+        self.instrumentation = None
+        # set by pd daemon, which keeps every open incident up to date
+        self.live_incidents = None
+
+    def instrument(self, instrumentation):
+        self.instrumentation = instrumentation
+        instrumentation.scheduler = self.scheduler
+        instrumentation.response_cache = self.response_cache
+        instrumentation.wrap(self.pager, self.scheduler)
+
+    @contextmanager
+    def timer(self, name):
+        if not self.instrumentation:
+            yield
+            return
+
+        with self.instrumentation.timer(name):
+            yield
+
+    def make_incident(self, raw):
+        with self.timer("incident construction"):
+            return Incident(self, raw)
 
     @property
     def me(self):
@@ -33,7 +171,17 @@ class Pagerduty():
             self._me = self.user(self.email)
         return self._me
 
-    def incidents(self, user_id = None, triggered = False):
+    def incidents(self, user_id = None, triggered = False, with_alerts = False):
+        if self.live_incidents is not None:
+            incidents = self.live_incidents.incidents(user_id, triggered)
+        else:
+            incidents = self.list_incidents(user_id, triggered)
+
+        if with_alerts:
+            return self.prefetch_alerts(incidents)
+        return incidents
+
+    def list_incidents(self, user_id = None, triggered = False):
         args = {
             'statuses': ['triggered'],
             'date_range': 'all',
@@ -45,13 +193,133 @@ class Pagerduty():
         if not triggered:
             args['statuses'].append('acknowledged')
 
-        def make_incident(raw):
-            return Incident(self, raw)
+        return map(self.make_incident, paginate(self.pager.incidents, containers = False, **args))
+
+    def alerts(self, incident_id):
+        return list(map(Alert, paginate(self.pager.alerts, containers = False, incident_id = incident_id)))
+
+    def prefetch_alerts(self, incidents, concurrency = DEFAULT_CONCURRENCY):
+        """Load the alerts for a whole set of incidents at once.
+
+        Alerts are fetched concurrently rather than lazily one incident at a
+        time, and the incidents are returned as a list.
+        """
+        incidents = list(incidents)
+        pending = [incident for incident in incidents if not hasattr(incident, '_alerts')]
+
+        for incident, alerts, error in run_all(lambda i: self.alerts(i.raw_id), pending, concurrency):
+            if error:
+                raise error
+            incident._alerts = alerts
 
-        incidents = map(make_incident, self.pager.incidents.list(**args))
         return incidents
 
-    def user(self, name):
+    def incidents_by_id(self, ids, concurrency = DEFAULT_CONCURRENCY):
+        """Fetch the given incidents concurrently, skipping any that no longer exist."""
+        incidents = []
+        for _, incident, error in run_all(self.show, ids, concurrency):
+            if isinstance(error, NotFound):
+                continue
+            if error:
+                raise error
+            incidents.append(incident)
+        return incidents
+
+    def log_entries(self, since, until = None):
+        """Everything that has happened to any incident since the given time (and until another)."""
+        if until is not None:
+            return paginate(self.pager.log_entries, since = since, until = until, is_overview = "true", include = [])
+        return paginate(self.pager.log_entries, since = since, is_overview = "true", include = [])
+
+    @staticmethod
+    def bulk_changes(ids, status = None, assignee = None):
+        changes = []
+        for _id in ids:
+            change = {
+                "id": _id,
+                "type": "incident_reference",
+            }
+            if status:
+                change["status"] = status
+            if assignee:
+                change["assignments"] = [{
+                    "assignee": {
+                        "id": assignee,
+                        "type": "user_reference",
+                    },
+                }]
+            changes.append(change)
+        return changes
+
+    def bulk_update(self, ids, status = None, assignee = None):
+        """Update many incidents (by id, not number) with as few requests as possible.
+
+        Returns a dict of id -> None on success, or the exception raised by
+        the request that carried it.
+        """
+        changes = Pagerduty.bulk_changes(ids, status = status, assignee = assignee)
+
+        results = {}
+        for start in range(0, len(changes), Pagerduty.BULK_UPDATE_SIZE):
+            chunk = changes[start:start + Pagerduty.BULK_UPDATE_SIZE]
+            try:
+                self.pager.request(
+                    "PUT",
+                    "incidents",
+                    data = json.dumps({"incidents": chunk}),
+                    extra_headers = {"From": self.email},
+                )
+                error = None
+            except Exception as e:
+                error = e
+
+            for change in chunk:
+                results[change["id"]] = error
+
+        return results
+
+    def _cached(self, kind, name):
+        if not self.cache:
+            return None
+
+        value = self.cache.get(kind, name)
+        if value is None:
+            return None
+
+        collection = getattr(self.pager, kind)
+        return collection.container(collection, **value)
+
+    def _store(self, kind, name, container):
+        if self.cache:
+            self.cache.set(kind, name, container.to_json())
+        return container
+
+    def refresh_cache(self):
+        # so the lookups below really do go to pagerduty
+        if self.response_cache:
+            self.response_cache.clear()
+
+        if not self.cache:
+            return
+
+        # oncalls are cheap to fetch again when next asked for
+        self.cache.clear("oncalls")
+
+        for kind in ["users", "schedules", "escalation_policies"]:
+            collection = getattr(self.pager, kind)
+            for name in self.cache.keys(kind):
+                found = list(collection.list(query = name))
+                if len(found) == 1:
+                    self._store(kind, name, found[0])
+                else:
+                    self.cache.delete(kind, name)
+
+    def user(self, name, refresh = False):
+        if not refresh:
+            cached = self._cached("users", name)
+            if cached:
+                return cached
+
         users = list(self.pager.users.list(query=name))
 
         if len(users) == 0:
@@ -64,79 +332,127 @@ class Pagerduty():
                 print("\t{} <{}>".format(user.name, user.email))
             sys.exit(2)
 
-        return users[0]
-
-    def oncalls(self):
-        raw_policies = list(Oncalls(self.pager).list())
-        policies = {}
-
-        for policy in raw_policies:
-            policy_id = policy.escalation_policy.id
-            if policy_id not in policies:
-                policies[policy_id] = {
-                    "name": policy.escalation_policy.summary,
-                    "id": policy_id,
-                    "levels": []
-                }
-
-            policies[policy_id]["levels"].append({
-                "level": policy.escalation_level,
-                "policy_name": policy.escalation_policy.summary,
-                "person": policy.user.summary,
-            })
-
-        for _, policy in policies.items():
-            policy["levels"].sort(key=lambda x: x['level'])
-
-        return policies
-
-    def summary(self, user_id = None, triggered = False):
-        # if not user_id:
-        #     user_id = self.user(self.email).id
-        incidents = self.incidents(user_id = user_id, triggered = triggered)
-
-        by_class = {}
-        for incident in incidents:
-            if incident.summary in by_class:
-                by_class[incident.summary].append(incident)
-            else:
-                by_class[incident.summary] = [incident]
-
-        return by_class
+        return self._store("users", name, users[0])
+
+    @staticmethod
+    def oncalls_query(policy_ids = None, schedule_ids = None):
+        args = {}
+        if policy_ids:
+            args['escalation_policy_ids'] = sorted(policy_ids)
+        if schedule_ids:
+            args['schedule_ids'] = sorted(schedule_ids)
+        return args
+
+    def _cached_oncalls(self, query):
+        if not self.cache:
+            return None
+
+        cached = self.cache.get("oncalls", json.dumps(query, sort_keys = True))
+        if cached is None:
+            return None
+
+        collection = Oncalls(self.pager)
+        return [collection.container(collection, **value) for value in cached]
+
+    def _store_oncalls(self, query, raw):
+        if not self.cache:
+            return raw
+
+        # valid until the next handoff, unless that's longer than the usual
+        # ttl; with no handoff to go by (nobody on call, or only shifts that
+        # never end) someone could come on call any time, so not for long
+        ttl = self.cache.ttls.get("oncalls", Cache.DEFAULT_TTL)
+        handoff = until_handoff(raw)
+        if handoff is None:
+            ttl = min(ttl, Cache.DEFAULT_TTL)
+        else:
+            ttl = min(ttl, handoff)
+        if ttl > 0:
+            self.cache.set("oncalls", json.dumps(query, sort_keys = True), [oncall.to_json() for oncall in raw], ttl = ttl)
+        return raw
+
+    def oncalls(self, policy_ids = None, schedule_ids = None, refresh = False):
+        """Who's on call, grouped by escalation policy.
+
+        Filtering by policy or schedule is done by pagerduty. Results are
+        cached until the next handoff, the earliest end of any shift in them.
+        """
+        query = Pagerduty.oncalls_query(policy_ids, schedule_ids)
+
+        raw = None if refresh else self._cached_oncalls(query)
+        if raw is None:
+            raw = self._store_oncalls(query, list(paginate(Oncalls(self.pager), **query)))
+
+        return group_oncalls(raw)
+
+    def summary(self, user_id = None, triggered = False, cluster = False):
+        return group_by_summary(self.incidents(user_id = user_id, triggered = triggered), cluster = cluster)
 
     def snooze(self, _id, delta=(24*60*60)):
         incident = self.pager.incidents.show(_id)
         if incident.status == "resolved":
-            print("already resolved: {}".format(incident.summary))
-            return
+            return "already resolved: {}".format(incident.summary)
 
         if incident.status == "triggered":
             incident.acknowledge(self.email)
 
-        print("snoozing {}".format(incident.summary))
         incident.snooze(self.email, delta)
+        return "snoozing {}".format(incident.summary)
 
     def ack(self, _id):
         incident = self.pager.incidents.show(_id)
         if incident.status != "triggered":
-            print("Incident {} is not triggered".format(_id))
-            sys.exit(2)
+            raise ActionError("Incident {} is not triggered".format(_id))
         incident.acknowledge(self.email)
+        return "acking {}".format(incident.summary)
 
     def resolve(self, _id):
         incident = self.pager.incidents.show(_id)
         if incident.status == "resolved":
-            print("Incident {} is already resolved".format(_id))
-            return
+            return "Incident {} is already resolved".format(_id)
         incident.resolve(self.email)
+        return "resolving {}".format(incident.summary)
 
     def show(self, _id):
-        return Incident(self.pager, self.pager.incidents.show(_id))
+        return self.make_incident(self.pager.incidents.show(_id))
+
+    def show_many(self, ids, concurrency = DEFAULT_CONCURRENCY):
+        """Fetch incidents and their alerts concurrently.
+
+        Yields (id, incident, error) in the order of `ids`, each as soon as
+        it and everything before it is ready. Given an incident's id rather
+        than its number, its alerts are fetched at the same time as the
+        incident instead of after it.
+        """
+        def fetch(_id):
+            if str(_id).isdigit():
+                incident = self.show(_id)
+                incident._alerts = self.alerts(incident.raw_id)
+                return incident
+
+            (_, incident, error), (_, alerts, alerts_error) = run_all(lambda get: get(_id), [self.show, self.alerts], 2)
+            if error or alerts_error:
+                raise error or alerts_error
+            incident._alerts = alerts
+            return incident
+
+        return run_all(fetch, ids, concurrency)
 
     def reassign(self, _id, user):
-        return self.pager.incidents.show(_id).reassign([user.id], self.email)
+        # incident numbers have to be turned into ids before they can be bulk updated
+        if str(_id).isdigit():
+            _id = self.pager.incidents.show(_id).id
+
+        error = self.bulk_update([_id], assignee = user.id)[_id]
+        if error:
+            raise error
+
+    def schedule(self, name, refresh = False):
+        if not refresh:
+            cached = self._cached("schedules", name)
+            if cached:
+                return cached
 
-    def schedule(self, name):
         schedules = list(self.pager.schedules.list(query = name))
 
         if len(schedules) == 0:
@@ -149,7 +465,27 @@ class Pagerduty():
                 print("\t({}) {}".format(schedule.id, schedule.name))
             sys.exit(2)
 
-        return schedules[0]
+        return self._store("schedules", name, schedules[0])
+
+    def escalation_policy(self, name, refresh = False):
+        if not refresh:
+            cached = self._cached("escalation_policies", name)
+            if cached:
+                return cached
+
+        policies = list(self.pager.escalation_policies.list(query = name))
+
+        if len(policies) == 0:
+            print("No escalation policy found with name \"{}\"".format(name))
+            sys.exit(2)
+
+        if len(policies) > 1:
+            print("Too many escalation policies found with name \"{}\"".format(name))
+            for policy in policies:
+                print("\t({}) {}".format(policy.id, policy.name))
+            sys.exit(2)
+
+        return self._store("escalation_policies", name, policies[0])
 
     def schedule_at(self, _id, start, end=None):
         args = { "since": start }
@@ -158,91 +494,146 @@ class Pagerduty():
 
         return self.pager.schedules.show(_id, **args)
 
+    def schedule_entries(self, schedules, since, until, concurrency = DEFAULT_CONCURRENCY):
+        """Who's on call on each schedule from since to until, as a list of dicts.
+
+        Long ranges are fetched a month at a time, all at once, and put back
+        together (see schedule.merge).
+        """
+        from .schedule import merge, windows
+
+        def fetch(job):
+            schedule, (start, end) = job
+            rendered = self.schedule_at(schedule.id, timestamp(start), timestamp(end))
+            return [{
+                "schedule_id": schedule.id,
+                "schedule": schedule.name,
+                "user_id": entry.user.id,
+                "user": entry.user.summary,
+                "start": parse_time(entry.start),
+                "end": parse_time(entry.end),
+            } for entry in rendered.final_schedule.rendered_schedule_entries]
+
+        jobs = [(schedule, window) for schedule in schedules for window in windows(since, until)]
+        entries = []
+        for _, found, error in run_all(fetch, jobs, concurrency):
+            if error:
+                raise error
+            entries.extend(found)
+
+        return merge(entries, since, until)
+
     def create_override(self, schedule_id, user_id, start, end):
-        schedule = self.pager.schedules.show(schedule_id)
+        # only the id is needed to post to the schedule's overrides, so there's no need to fetch it
+        schedule = pygerduty.v2.Schedule(self.pager.schedules, id = schedule_id)
         schedule.overrides.create(start = start, end = end, user_id = user_id)
+        # whoever was cached as on call may not be any more
+        if self.cache:
+            self.cache.clear("oncalls")
+
 
+def payload(raw):
+    """A pygerduty container or a plain dict from the api, as a dict."""
+    if isinstance(raw, pygerduty.v2.Container):
+        return raw.to_json()
+    return raw
 
 class Incident():
-    classifications = {
-        "Outdated running instance": "outdated instance",
-        "Plan does not match remote state for": "terraform plan",
-    }
+    """The parts of a pagerduty incident pd uses.
+
+    Slotted and holding plain values, so tens of thousands of them fit in
+    memory; the full api payload is kept as a json string and only turned back
+    into a pygerduty container if something asks for `raw`.
+    """
+
+    __slots__ = (
+        'pager', 'raw_id', 'id', 'title', 'time', 'status', 'urgency', 'url',
+        'assignee', 'assignee_ids', 'incident_key', 'type',
+        '_parsed', '_summary', '_payload', '_raw',
+        '_created_at', '_date', '_alerts', '_dedup_key',
+    )
 
     def __init__(self, pager, raw_incident):
+        raw = payload(raw_incident)
         self.pager = pager
-        self.raw = raw_incident
-        self.classify()
-        self._parse()
 
         # set some useful things from raw incident
-        self.id = self.raw.incident_number
-        self.time = self.raw.created_at
-        self.status = self.raw.status
-        self.urgency = self.raw.urgency
-        self.created_at = maya.parse(self.time).datetime(to_timezone=str(tzlocal.get_localzone()))
-        self.date = self.created_at.strftime("%Y-%m-%d")
+        self.raw_id = raw['id']
+        self.id = raw['incident_number']
+        self.title = raw['title']
+        self.time = raw['created_at']
+        self.status = raw['status']
+        self.urgency = raw.get('urgency')
+        self.url = raw.get('html_url')
+        self.incident_key = raw.get('incident_key')
+
+        assignments = raw.get('assignments') or []
+        self.assignee = assignments[0]['assignee']['summary'] if assignments else "(none)"
+        self.assignee_ids = tuple(assignment['assignee']['id'] for assignment in assignments)
+
+        self._payload = json.dumps(raw, separators=(',', ':'))
+        self.classify()
+
+    @property
+    def raw(self):
+        if not hasattr(self, '_raw'):
+            collection = self.pager.pager.incidents
+            self._raw = collection.container(collection, **json.loads(self._payload))
+        return self._raw
+
+    @property
+    def payload(self):
+        """The incident as pagerduty sent it, as json."""
+        return self._payload
 
-        self.url = self.raw.html_url
+    @property
+    def created_at(self):
+        if not hasattr(self, '_created_at'):
+            self._created_at = parse_time(self.time)
+        return self._created_at
+
+    @property
+    def date(self):
+        if not hasattr(self, '_date'):
+            self._date = self.created_at.strftime("%Y-%m-%d")
+        return self._date
 
     def classify(self):
-        for prefix, klass in Incident.classifications.items():
-            if self.raw.title.startswith(prefix):
-                self.type = klass
-                return
-        self.type = None
-
-    def _parse(self):
-        if not self.type:
-            self.parsed = {}
-        elif self.type == "outdated instance":
-            self.parsed = parse.parse(
-                "Outdated running instance ({simple_name} - {instance_id}) found in {environment}",
-                self.raw.title
-            ).named
-
-            if self.parsed['simple_name'][-10:-1] == "us-east-1":
-                self.parsed['simple_name'] = self.parsed['simple_name'][:-11]
-
-            self._summary = "outdated instance: {}".format(self.parsed['simple_name'])
-        elif self.type == "terraform plan":
-            self.parsed = parse.parse(
-                "Plan does not match remote state for: {repo} in Workspace: {workspace}",
-                self.raw.title
-            ).named
-            self._summary = "terraform plan: {}".format(self.parsed['repo'])
+        # the parsed fields are shared with every other incident with this title
+        self.type, self._parsed, summary = self.pager.classifier.classify(self.title)
+        if summary is not None:
+            self._summary = summary
+
+    @property
+    def parsed(self):
+        return dict(self._parsed)
 
     @property
     def summary(self):
         if hasattr(self, '_summary'):
             return self._summary
-        return self.raw.title
+        return self.title
 
     @property
     def raw_summary(self):
-        return self.raw.title
+        return self.title
 
     @property
     def alerts(self):
         if not hasattr(self, '_alerts'):
-            self._alerts = list(map(Alert, self.pager.alerts.list(incident_id = self.raw.id)))
+            self._alerts = self.pager.alerts(self.raw_id)
         return self._alerts
 
     @property
     def dedup_key(self):
         if not hasattr(self, '_dedup_key'):
-            self._dedup_key = self.alerts[0].alert_key
-        return self._dedup_key
-
-    @property
-    def assignee(self):
-        if not hasattr(self, '_assignee'):
-            assignments = self.raw.assignments
-            if assignments:
-                self._assignee = self.raw.assignments[0].assignee.summary
+            # the incident key is the dedup key of the alert that opened the
+            # incident, so only go fetch alerts when it's missing
+            if self.incident_key:
+                self._dedup_key = self.incident_key
             else:
-                self._assignee = "(none)"
-        return self._assignee
+                self._dedup_key = self.alerts[0].alert_key if self.alerts else None
+        return self._dedup_key
 
     def dict(self, show_user = False):
         out = {
@@ -256,30 +647,58 @@ class Incident():
         }
 
         if show_user:
-            out['user'] = self.raw.assignments[0].assignee.summary
+            out['user'] = self.assignee
 
         return out
 
     def acknowledge(self, email):
         self.raw.acknowledge(email)
+        return "acking {}".format(self.summary)
+
+    def snooze(self, email, duration):
+        self.raw.snooze(email, duration)
+        return "snoozing {}".format(self.summary)
 
 class Alert():
+    """Like Incident, keeps what pd shows of an alert and its payload as json."""
+
     class AlertBody():
+        __slots__ = ('details', 'contexts')
+
         def __init__(self, body):
-            self.details = body.details
-            self.contexts = body.contexts
+            self.details = body.get('details')
+            self.contexts = [Context(**context) for context in body.get('contexts') or []]
 
         def details_str(self):
             if isinstance(self.details, str):
                 return self.details
             return json.dumps(self.details, cls=ContainerEncoder, indent=4)
 
+    __slots__ = ('id', 'alert_key', 'body', '_payload')
+
     def __init__(self, raw_alert):
-        self.raw = raw_alert
-        self.alert_key = self.raw.alert_key
-        self.body = Alert.AlertBody(self.raw.body)
-        self.contexts = self.raw.body.contexts
+        raw = payload(raw_alert)
+        self.id = raw['id']
+        self.alert_key = raw.get('alert_key')
+        self.body = Alert.AlertBody(raw.get('body') or {})
+        self._payload = json.dumps(raw, separators=(',', ':'))
+
+    @property
+    def contexts(self):
+        return self.body.contexts
+
+    @property
+    def payload(self):
+        return self._payload
+
+class Context():
+    __slots__ = ('type', 'text', 'href', 'src')
 
+    def __init__(self, type = None, text = None, href = None, src = None, **rest):
+        self.type = type
+        self.text = text
+        self.href = href
+        self.src = src
 
 class ContainerEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -293,8 +712,8 @@ class Oncall(pygerduty.v2.Container):
 class Oncalls(pygerduty.v2.Collection):
     container = Oncall
 
-    def _list_no_pagination(self, **kwargs):
-        data = pygerduty.v2.Collection._list_no_pagination(self, **kwargs)
+    def _list_response(self, response):
+        data = pygerduty.v2.Collection._list_response(self, response)
         def add_id(container):
             fake_id = "{}-{}".format(container.escalation_policy.id, container.escalation_level)
             container._kwargs["id"] = fake_id
@@ -0,0 +1,66 @@
+from itertools import islice
+
+from .utils import run_all
+
+# the most pagerduty will return in one page
+PAGE_SIZE = 100
+PAGE_CONCURRENCY = 4
+
+
+def paginate(collection, concurrency = PAGE_CONCURRENCY, limit = PAGE_SIZE, containers = True, **kwargs):
+    """List everything in a pygerduty collection, fetching pages concurrently.
+
+    The first page is requested with total=true, which says how many pages
+    there are, so the rest can all be fetched at once (at most `concurrency`
+    at a time). Items are yielded in order, and items repeated across pages
+    (if the list changed while we were reading it) are only yielded once.
+    With `containers=False` they're the plain dicts from the api instead of
+    pygerduty containers, which are a lot slower to build.
+    """
+    kwargs = collection._apply_default_kwargs(kwargs)
+
+    def fetch(offset, total = False):
+        params = dict(kwargs, offset = offset, limit = limit)
+        if total:
+            params['total'] = 'true'
+        return collection.pagerduty.request("GET", collection.name, query_params=params)
+
+    seen = set()
+
+    def items(response):
+        found = collection._list_response(response) if containers else response.get(collection.name, [])
+        for item in found:
+            _id = item.id if containers else item['id']
+            if _id in seen:
+                continue
+            seen.add(_id)
+            yield item
+
+    first = fetch(0, total = True)
+    yield from items(first)
+
+    total = first.get('total')
+    if total is None:
+        # no total to go on, so walk the pages one at a time instead
+        offset = limit
+        response = first
+        while response.get('more'):
+            response = fetch(offset)
+            yield from items(response)
+            offset += limit
+        return
+
+    for offset, response, error in run_all(fetch, range(limit, total, limit), concurrency):
+        if error:
+            raise error
+        yield from items(response)
+
+
+def pages(items, size = PAGE_SIZE):
+    """Items in lists of `size`, each as soon as it's complete; from a paginate()
+    listing, each list is one page, so it's ready as soon as that page is."""
+    items = iter(items)
+    page = list(islice(items, size))
+    while page:
+        yield page
+        page = list(islice(items, size))
@@ -0,0 +1,103 @@
+import csv
+import hashlib
+import io
+
+from datetime import datetime, timezone
+
+from .utils import timestamp
+
+CSV_HEADERS = ["schedule", "user", "start", "end"]
+
+
+def windows(since, until):
+    """Whole calendar months (in utc) covering since to until, as (start, end).
+
+    Always whole months, so that exporting overlapping ranges asks for the
+    same windows and the response cache can answer the second time.
+    """
+    since = since.astimezone(timezone.utc)
+    start = datetime(since.year, since.month, 1, tzinfo = timezone.utc)
+    while start < until:
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo = timezone.utc)
+        yield start, end
+        start = end
+
+
+def merge(entries, since, until):
+    """Entries from several windows as one list, sorted by schedule and start.
+
+    Duplicates are dropped, shifts that were cut in two at the edge of a
+    window are joined back up, and everything is cut down to since..until,
+    with "shift_start" keeping when each shift really started.
+    """
+    merged = []
+    for entry in sorted(entries, key = lambda entry: (entry["schedule_id"], entry["start"], entry["end"])):
+        if entry["end"] <= since or entry["start"] >= until:
+            continue
+
+        last = merged[-1] if merged else None
+        if last and last["schedule_id"] == entry["schedule_id"] and last["user_id"] == entry["user_id"] and entry["start"] <= last["end"]:
+            last["end"] = max(last["end"], entry["end"])
+            continue
+
+        merged.append(dict(entry))
+
+    for entry in merged:
+        entry["shift_start"] = entry["start"]
+        entry["start"] = max(entry["start"], since)
+        entry["end"] = min(entry["end"], until)
+    return merged
+
+
+def to_csv(entries):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_HEADERS)
+    for entry in entries:
+        writer.writerow([entry["schedule"], entry["user"], entry["start"].isoformat(), entry["end"].isoformat()])
+    return out.getvalue()
+
+
+def ics_text(text):
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def ics_time(when):
+    return when.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def ics_fold(line):
+    """Lines longer than 75 octets continue on the next line after a space, as ics wants."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+
+    lines = []
+    while data:
+        size = 75 if not lines else 74
+        # don't split a multi-byte character
+        while size < len(data) and data[size] & 0xC0 == 0x80:
+            size -= 1
+        lines.append(data[:size].decode("utf-8"))
+        data = data[size:]
+    return "\r\n ".join(lines)
+
+
+def to_ics(entries):
+    now = ics_time(datetime.now(timezone.utc))
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//pd//schedule export//EN"]
+    for entry in entries:
+        # stable, so importing a later export updates events instead of
+        # duplicating them, even one starting partway through the shift
+        uid = hashlib.sha1("{} {} {}".format(entry["schedule_id"], entry["user_id"], timestamp(entry["shift_start"])).encode()).hexdigest()
+        lines += [
+            "BEGIN:VEVENT",
+            "UID:{}@pd".format(uid),
+            "DTSTAMP:{}".format(now),
+            "DTSTART:{}".format(ics_time(entry["start"])),
+            "DTEND:{}".format(ics_time(entry["end"])),
+            "SUMMARY:{}".format(ics_text("{} on call ({})".format(entry["user"], entry["schedule"]))),
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return "".join(ics_fold(line) + "\r\n" for line in lines)
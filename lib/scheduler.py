@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+
+# pagerduty's documented REST API limit for a user's api key
+DEFAULT_RATE_LIMIT = 960
+
+
+def rate_limit_delay(headers):
+    """How long pagerduty asked us to wait, if it said."""
+    if headers is None:
+        return None
+
+    for header in ['Retry-After', 'ratelimit-reset']:
+        value = headers.get(header)
+        if value:
+            try:
+                return max(0, float(value))
+            except ValueError:
+                pass
+    return None
+
+
+class RequestScheduler():
+    """Keeps requests under pagerduty's rate limit.
+
+    Requests take a token from a bucket refilled at `rate_limit` per minute,
+    and at most `limit` of them are in flight at once. A 429 halves `limit`
+    and the request is retried after however long pagerduty asked for (or an
+    exponential backoff with jitter); every `limit` successes in a row let it
+    grow by one again, up to `max_concurrency`.
+    """
+
+    RETRIES = 5
+    BACKOFF = 0.5
+    MAX_BACKOFF = 30
+
+    def __init__(self, rate_limit = DEFAULT_RATE_LIMIT, max_concurrency = 16):
+        self.condition = threading.Condition()
+        self.rate = rate_limit / 60
+        self.capacity = max(1, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+
+        self.counters = {
+            "requests": 0,
+            "throttled": 0,
+            "retries": 0,
+            "seconds_waiting_for_tokens": 0,
+            "seconds_waiting_for_slots": 0,
+            "seconds_backing_off": 0,
+        }
+
+    def count(self, name, amount = 1):
+        with self.condition:
+            self.counters[name] += amount
+
+    def reserve(self):
+        """Take a token, returning how long to wait before it can be used."""
+        with self.condition:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            self.tokens -= 1
+            self.counters["requests"] += 1
+            wait = max(0, -self.tokens / self.rate)
+            self.counters["seconds_waiting_for_tokens"] += wait
+            return wait
+
+    def backoff(self, attempt, headers = None):
+        delay = rate_limit_delay(headers)
+        if delay is None:
+            delay = min(RequestScheduler.MAX_BACKOFF, RequestScheduler.BACKOFF * 2 ** attempt)
+            delay = random.uniform(delay / 2, delay)
+
+        with self.condition:
+            self.counters["throttled"] += 1
+            self.counters["seconds_backing_off"] += delay
+        return delay
+
+    def acquire(self):
+        start = time.monotonic()
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+            self.counters["seconds_waiting_for_slots"] += time.monotonic() - start
+
+    def release(self, throttled):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+            else:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+    def wrap(self, pager):
+        # looked up on every request, so instrumentation can go underneath
+        self.send = pager.request
+
+        def scheduled_request(method, path, query_params=None, data=None, extra_headers=None):
+            attempt = 0
+            while True:
+                wait = self.reserve()
+                if wait:
+                    time.sleep(wait)
+
+                self.acquire()
+                throttled = False
+                try:
+                    return self.send(method, path, query_params=query_params, data=data, extra_headers=extra_headers)
+                except Exception as e:
+                    # pygerduty lets urllib's HTTPError for a 429 straight through
+                    if getattr(e, 'code', None) != 429 or attempt >= RequestScheduler.RETRIES:
+                        raise
+                    throttled = True
+                    delay = self.backoff(attempt, getattr(e, 'headers', None))
+                finally:
+                    self.release(throttled)
+
+                time.sleep(delay)
+                attempt += 1
+                self.count("retries")
+
+        pager.request = scheduled_request
+
+    def stats(self):
+        with self.condition:
+            return dict(self.counters, concurrency_limit = self.limit)
@@ -0,0 +1,52 @@
+import difflib
+import re
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SummaryIndex():
+    """Fuzzy lookup of incident summaries.
+
+    Every summary is split into words and indexed by them, so a query like
+    "outdated security-dns" finds "outdated instance: security-dns-dns". Each
+    word of the query has to match a word of the summary exactly, as a prefix,
+    or closely enough to forgive a typo.
+    """
+
+    CUTOFF = 0.8
+
+    def __init__(self, summaries):
+        self.summaries = list(summaries)
+        self.index = {}
+        for position, summary in enumerate(self.summaries):
+            for token in tokenize(summary):
+                self.index.setdefault(token, set()).add(position)
+
+    def similar_tokens(self, token):
+        if token in self.index:
+            yield token
+
+        for candidate in self.index:
+            if candidate != token and candidate.startswith(token):
+                yield candidate
+
+        for candidate in difflib.get_close_matches(token, self.index.keys(), n=5, cutoff=SummaryIndex.CUTOFF):
+            if candidate != token:
+                yield candidate
+
+    def search(self, query):
+        matches = None
+        for token in tokenize(query):
+            positions = set()
+            for similar in self.similar_tokens(token):
+                positions |= self.index[similar]
+
+            matches = positions if matches is None else matches & positions
+            if not matches:
+                return []
+
+        return [self.summaries[position] for position in sorted(matches or [])]
@@ -0,0 +1,291 @@
+import json
+import sqlite3
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from .paginate import paginate
+from .pagerduty import Alert
+from .utils import DEFAULT_CONCURRENCY, run_all, timestamp
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id TEXT PRIMARY KEY,
+    number INTEGER,
+    status TEXT,
+    created_at TEXT,
+    last_status_change_at TEXT,
+    assignee_id TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS incidents_number ON incidents (number);
+CREATE INDEX IF NOT EXISTS incidents_status ON incidents (status, assignee_id);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    id TEXT PRIMARY KEY,
+    incident_id TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS alerts_incident ON alerts (incident_id);
+
+CREATE TABLE IF NOT EXISTS sync (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# added since the first version of the schema, so older stores get them too;
+# the ones that can be are filled in from the raw incidents
+COLUMNS = [
+    ("title", "TEXT", "json_extract(raw, '$.title')"),
+    ("service", "TEXT", "json_extract(raw, '$.service.summary')"),
+    ("acknowledged_at", "TEXT", None),
+    ("resolved_at", "TEXT", None),
+    ("created", "INTEGER", None),
+    ("ack_seconds", "INTEGER", None),
+    ("resolve_seconds", "INTEGER", None),
+    ("klass", "TEXT", None),
+    ("summary", "TEXT", None),
+]
+
+# numbers worked out from the timestamps once, when they're saved, so pd
+# report only has integers to add up
+DERIVED = """
+    created = CAST(strftime('%s', created_at) AS INTEGER),
+    ack_seconds = strftime('%s', acknowledged_at) - strftime('%s', created_at),
+    resolve_seconds = strftime('%s', resolved_at) - strftime('%s', created_at)
+"""
+
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class Store():
+    """A local sqlite copy of incidents and their alerts.
+
+    `sync` brings it up to date: the first time with every incident created
+    since a given date, after that with just the incidents created or changed
+    since the last sync. Incidents read back out of it are ordinary Incident
+    objects with their alerts already loaded.
+    """
+
+    # how far back each sync re-reads, so clock skew can't make it miss anything
+    OVERLAP = timedelta(minutes = 5)
+    # how far back the first sync goes, unless told otherwise
+    HISTORY = timedelta(days = 30)
+    ALL_STATUSES = ["triggered", "acknowledged", "resolved"]
+    # the most pagerduty lists incidents for at once is 6 months
+    WINDOW = timedelta(days = 180)
+
+    @classmethod
+    def default_path(cls):
+        return Path.home() / '.config' / 'pd-incidents.sqlite'
+
+    def __init__(self, path = None):
+        self.path = Path(path) if path else Store.default_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.executescript(SCHEMA)
+        self.migrate()
+
+    def migrate(self):
+        existing = [row[1] for row in self.db.execute("PRAGMA table_info(incidents)")]
+        missing = [column for column in COLUMNS if column[0] not in existing]
+        for column, kind, fill in missing:
+            self.db.execute("ALTER TABLE incidents ADD COLUMN {} {}".format(column, kind))
+            if fill:
+                self.db.execute("UPDATE incidents SET {} = {}".format(column, fill))
+
+        if missing:
+            self.db.execute("UPDATE incidents SET {}".format(DERIVED))
+            # made again below with the new columns
+            self.db.execute("DROP INDEX IF EXISTS incidents_report")
+        # covers everything pd report reads, so it never touches the raw incidents
+        self.db.execute("CREATE INDEX IF NOT EXISTS incidents_report ON incidents (created, klass, summary, title, service, ack_seconds, resolve_seconds)")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def get(self, key):
+        row = self.db.execute("SELECT value FROM sync WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO sync (key, value) VALUES (?, ?)", (key, value))
+
+    def classify(self, classifier):
+        """Work out the class and summary of every incident, for pd report to group by.
+
+        Incidents are classified as they're saved, so this only has anything
+        to do for a new store column or when the rules have changed, and then
+        classifies each different title once.
+        """
+        if self.get("classifier") == classifier.key:
+            return
+
+        classes = {}
+        rows = []
+        for id, title in self.db.execute("SELECT id, title FROM incidents"):
+            if title not in classes:
+                klass, _, summary = classifier._classify(title or "")
+                classes[title] = (klass, summary)
+            rows.append(classes[title] + (id,))
+        self.db.executemany("UPDATE incidents SET klass = ?, summary = ? WHERE id = ?", rows)
+        self.put("classifier", classifier.key)
+        self.db.commit()
+
+    def save(self, raw, alerts, classifier):
+        klass, _, summary = classifier.classify(raw['title'])
+        assignments = raw.get('assignments') or []
+        service = raw.get('service')
+        acknowledgements = raw.get('acknowledgements') or []
+        # ack and resolve times from the log entries are kept when an incident is saved again
+        self.db.execute(
+            """INSERT INTO incidents (id, number, status, created_at, last_status_change_at, assignee_id, raw, title, service, acknowledged_at, resolved_at, klass, summary)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                status = excluded.status,
+                last_status_change_at = excluded.last_status_change_at,
+                assignee_id = excluded.assignee_id,
+                raw = excluded.raw,
+                title = excluded.title,
+                service = excluded.service,
+                klass = excluded.klass,
+                summary = excluded.summary,
+                acknowledged_at = coalesce(acknowledged_at, excluded.acknowledged_at),
+                resolved_at = CASE WHEN excluded.status = 'resolved' THEN coalesce(excluded.resolved_at, resolved_at) END""",
+            (
+                raw['id'],
+                raw['incident_number'],
+                raw['status'],
+                raw['created_at'],
+                raw.get('last_status_change_at'),
+                assignments[0]['assignee']['id'] if assignments else None,
+                json.dumps(raw, separators=(',', ':')),
+                raw['title'],
+                service['summary'] if service else None,
+                min(ack['at'] for ack in acknowledgements) if acknowledgements else None,
+                raw.get('last_status_change_at') if raw['status'] == "resolved" else None,
+                klass,
+                summary,
+            ),
+        )
+        self.db.execute("UPDATE incidents SET {} WHERE id = ?".format(DERIVED), (raw['id'],))
+        self.db.execute("DELETE FROM alerts WHERE incident_id = ?", (raw['id'],))
+        self.db.executemany(
+            "INSERT OR REPLACE INTO alerts VALUES (?, ?, ?)",
+            [(alert.id, raw['id'], alert.payload) for alert in alerts],
+        )
+
+    def sync(self, client, since = None, concurrency = DEFAULT_CONCURRENCY):
+        """Fetch whatever changed since the last sync (or for a first sync, since `since`).
+
+        Goes a window (see WINDOW) at a time, as pagerduty won't list more
+        at once, and each window is committed as it's done, so a sync that
+        fails partway carries on from there next time. Returns how many
+        incidents were saved.
+        """
+        started = datetime.now(timezone.utc)
+        self.classify(client.classifier)
+        last_sync = self.get("synced_at")
+
+        if last_sync:
+            since = parse_timestamp(last_sync) - Store.OVERLAP
+        elif since is None:
+            since = started - Store.HISTORY
+        else:
+            since = parse_timestamp(since)
+
+        count = 0
+        # incidents created before the first sync's start aren't wanted, but
+        # ones from earlier windows that changed later have to be caught up on
+        catch_up = bool(last_sync)
+        while since < started:
+            until = min(since + Store.WINDOW, started)
+            count += self.sync_window(client, since, until, catch_up, concurrency)
+            self.put("synced_at", timestamp(until))
+            self.db.commit()
+            since = until
+            catch_up = True
+        return count
+
+    def sync_window(self, client, since, until, catch_up, concurrency):
+        """Save incidents created from since to until, and (with `catch_up`) older ones
+        changed then. Incidents come from one listing and the log entries, which also
+        say when each was acknowledged and resolved; alerts are fetched concurrently."""
+        since, until = timestamp(since), timestamp(until)
+
+        raws = {}
+        for raw in paginate(client.pager.incidents, containers = False, since = since, until = until, statuses = Store.ALL_STATUSES):
+            raws[raw['id']] = raw
+
+        entries = list(client.log_entries(since, until))
+        if catch_up:
+            changed = set(entry.incident.id for entry in entries) - set(raws)
+            for incident in client.incidents_by_id(sorted(changed), concurrency):
+                raws[incident.raw_id] = json.loads(incident.payload)
+
+        pending = sorted(raws.values(), key = lambda raw: raw['created_at'])
+        for raw, alerts, error in run_all(lambda raw: client.alerts(raw['id']), pending, concurrency):
+            if error:
+                raise error
+            self.save(raw, alerts, client.classifier)
+
+        self.record(entries)
+        return len(pending)
+
+    def record(self, entries):
+        """Note when incidents were first acknowledged and last resolved, from their log entries."""
+        for entry in entries:
+            if entry.type == "acknowledge_log_entry":
+                self.db.execute(
+                    "UPDATE incidents SET acknowledged_at = ? WHERE id = ? AND (acknowledged_at IS NULL OR acknowledged_at > ?)",
+                    (entry.created_at, entry.incident.id, entry.created_at),
+                )
+            elif entry.type == "resolve_log_entry":
+                self.db.execute(
+                    "UPDATE incidents SET resolved_at = ? WHERE id = ? AND status = 'resolved' AND (resolved_at IS NULL OR resolved_at < ?)",
+                    (entry.created_at, entry.incident.id, entry.created_at),
+                )
+            else:
+                continue
+            self.db.execute("UPDATE incidents SET {} WHERE id = ?".format(DERIVED), (entry.incident.id,))
+
+    def make_incident(self, client, row):
+        raw, alerts = row
+        incident = client.make_incident(json.loads(raw))
+        incident._alerts = [Alert(json.loads(alert)) for alert in alerts]
+        return incident
+
+    def select(self, client, where, args):
+        """Incidents matching a WHERE clause, with their alerts, in order of number."""
+        rows = self.db.execute(
+            "SELECT id, raw FROM incidents WHERE {} ORDER BY number".format(where), args,
+        ).fetchall()
+
+        alerts = {}
+        for incident_id, raw in self.db.execute(
+            "SELECT incident_id, raw FROM alerts WHERE incident_id IN (SELECT id FROM incidents WHERE {}) ORDER BY rowid".format(where),
+            args,
+        ):
+            alerts.setdefault(incident_id, []).append(raw)
+
+        return [self.make_incident(client, (raw, alerts.get(_id, []))) for _id, raw in rows]
+
+    def incidents(self, client, user_id = None, triggered = False):
+        """Open incidents as of the last sync, like Pagerduty.incidents."""
+        statuses = ["triggered"] if triggered else ["triggered", "acknowledged"]
+        where = "status IN ({})".format(",".join("?" * len(statuses)))
+        args = list(statuses)
+        if user_id:
+            where += " AND assignee_id = ?"
+            args.append(user_id)
+
+        return self.select(client, where, args)
+
+    def show(self, client, _id):
+        """An incident by number or id, or None if it hasn't been synced."""
+        found = self.select(client, "id = ? OR number = ?", [str(_id), int(_id) if str(_id).isdigit() else None])
+        return found[0] if found else None
@@ -0,0 +1,261 @@
+import base64
+import gzip
+import hashlib
+import http.client
+import io
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pygerduty.common
+
+from .cache import HIT, MISS, REVALIDATED
+from urllib.parse import unquote, urlsplit
+
+TRANSPORTS = ["pooled", "urllib"]
+
+# failures that mean a kept-alive connection was closed under us
+CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+RETRY_STATUSES = [502, 503, 504]
+
+
+class Response():
+    def __init__(self, status, headers, data):
+        self.status = status
+        self.headers = headers
+        self.body = io.BytesIO(data)
+
+    def read(self, *args):
+        return self.body.read(*args)
+
+
+class Proxy():
+    """An http proxy from the environment (HTTPS_PROXY and friends), as urllib would use it."""
+
+    def __init__(self, url):
+        parts = urlsplit(url if "://" in url else "http://" + url)
+        self.scheme = parts.scheme
+        self.address = parts.hostname + (":{}".format(parts.port) if parts.port else "")
+        self.headers = {}
+        if parts.username:
+            credentials = "{}:{}".format(unquote(parts.username), unquote(parts.password or ""))
+            self.headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode()
+
+    @classmethod
+    def lookup(cls, scheme, netloc):
+        """The proxy for a host, or None to connect straight to it (no proxy, or no_proxy says so)."""
+        url = urllib.request.getproxies().get(scheme)
+        if not url or urllib.request.proxy_bypass(netloc):
+            return None
+        return cls(url)
+
+
+class PooledOpener():
+    """A stand-in for urllib's opener that keeps connections alive.
+
+    Connections are pooled per host and shared between threads, responses are
+    requested gzipped, and requests that fail because of a dropped connection
+    or a gateway error are retried. Proxies are used like urllib uses them:
+    https is tunnelled through an http proxy, plain http is sent to it, and
+    anything else (eg. an https proxy) goes through urllib's own opener.
+    """
+
+    def __init__(self, max_connections = 10, retries = 2, backoff = 0.5):
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.proxies = {}
+
+    def proxy(self, scheme, netloc):
+        with self.lock:
+            if (scheme, netloc) not in self.proxies:
+                self.proxies[(scheme, netloc)] = Proxy.lookup(scheme, netloc)
+            return self.proxies[(scheme, netloc)]
+
+    def _acquire(self, scheme, netloc, timeout, proxy):
+        with self.lock:
+            idle = self.idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+
+        if proxy is None:
+            if scheme == "https":
+                return http.client.HTTPSConnection(netloc, timeout=timeout), False
+            return http.client.HTTPConnection(netloc, timeout=timeout), False
+
+        if scheme == "https":
+            connection = http.client.HTTPSConnection(proxy.address, timeout=timeout)
+            connection.set_tunnel(netloc, headers=proxy.headers)
+            return connection, False
+        return http.client.HTTPConnection(proxy.address, timeout=timeout), False
+
+    def _release(self, scheme, netloc, connection):
+        with self.lock:
+            idle = self.idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_connections:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            for idle in self.idle.values():
+                for connection in idle:
+                    connection.close()
+            self.idle = {}
+
+    def _send(self, request, timeout, proxy):
+        url = urlsplit(request.get_full_url())
+        selector = url.path + ("?" + url.query if url.query else "")
+        headers = dict(request.header_items())
+        headers["Accept-Encoding"] = "gzip"
+        if proxy is not None and url.scheme == "http":
+            # sent to the proxy as it is, rather than through a tunnel
+            selector = request.get_full_url()
+            headers.update(proxy.headers)
+
+        # a connection from the pool may have been closed by the server since
+        # it was last used, in which case try again on a fresh one
+        while True:
+            connection, reused = self._acquire(url.scheme, url.netloc, timeout, proxy)
+            try:
+                connection.request(request.get_method(), selector, body=request.data, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except CONNECTION_ERRORS:
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(url.scheme, url.netloc, connection)
+
+            if response.getheader("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+
+            return Response(response.status, response.msg, data)
+
+    def open(self, request, timeout = None):
+        url = urlsplit(request.get_full_url())
+        proxy = self.proxy(url.scheme, url.netloc)
+        if proxy is not None and proxy.scheme != "http":
+            if not hasattr(self, '_urllib_opener'):
+                self._urllib_opener = urllib.request.build_opener()
+            return self._urllib_opener.open(request, timeout = timeout)
+
+        attempt = 0
+        while True:
+            try:
+                response = self._send(request, timeout, proxy)
+            except (OSError, http.client.HTTPException):
+                if attempt >= self.retries or request.get_method() != "GET":
+                    raise
+            else:
+                if response.status < 400:
+                    return response
+
+                if response.status not in RETRY_STATUSES or attempt >= self.retries or request.get_method() != "GET":
+                    raise urllib.error.HTTPError(
+                        request.get_full_url(),
+                        response.status,
+                        http.client.responses.get(response.status, ""),
+                        response.headers,
+                        response.body,
+                    )
+
+            attempt += 1
+            time.sleep(self.backoff * 2 ** (attempt - 1))
+
+
+class PooledRequester(pygerduty.common.Requester):
+    """pygerduty's Requester, sending everything through a PooledOpener."""
+
+    def __init__(self, timeout = 10, retries = 2, max_connections = 10):
+        super().__init__(timeout=timeout)
+        self.opener = PooledOpener(max_connections=max_connections, retries=retries)
+
+
+class CachingOpener():
+    """Wraps an opener, answering GETs of slow-changing endpoints from a ResponseCache.
+
+    Requests are cached by their full url, so each query and page is kept
+    separately, and only for endpoints the cache has a ttl for. Anything
+    that isn't a GET passes straight through, and forgets what was cached for
+    the thing it changed (eg. creating an override on a schedule drops that
+    schedule's responses).
+    """
+
+    def __init__(self, opener, cache, api_base):
+        self.opener = opener
+        self.cache = cache
+        self.base = urlsplit(api_base).path
+
+    def resource(self, request):
+        """https://api.pagerduty.com/schedules/PABC/overrides?x=y -> ("schedules", "schedules/PABC/overrides")"""
+        path = urlsplit(request.get_full_url()).path
+        if path.startswith(self.base):
+            path = path[len(self.base):]
+        path = path.strip("/")
+        return path.split("/")[0], path
+
+    def key(self, request):
+        # the api key is part of it, so switching accounts can't mix them up
+        account = hashlib.sha1(request.get_header("Authorization", "").encode()).hexdigest()[:12]
+        return "{} {}".format(account, request.get_full_url())
+
+    def open(self, request, timeout = None):
+        endpoint, path = self.resource(request)
+        ttl = self.cache.ttls.get(endpoint)
+        if not ttl:
+            return self.opener.open(request, timeout = timeout)
+
+        if request.get_method() != "GET":
+            response = self.opener.open(request, timeout = timeout)
+            # all of what changed, eg. the schedule an override was added to
+            self.cache.invalidate("/".join(path.split("/")[:2]))
+            return response
+
+        key = self.key(request)
+        cached = self.cache.get(key, ttl)
+        if cached:
+            etag, body, fresh = cached
+            if fresh:
+                self.cache.count(endpoint, HIT)
+                return Response(200, {}, body)
+            if etag:
+                request.add_header("If-None-Match", etag)
+
+        try:
+            response = self.opener.open(request, timeout = timeout)
+        except urllib.error.HTTPError as e:
+            # urllib's opener treats anything but a 2xx as an error
+            if e.code != 304 or not cached:
+                raise
+            response = e
+
+        if response.status == 304 and cached:
+            self.cache.touch(key)
+            self.cache.count(endpoint, REVALIDATED)
+            return Response(200, response.headers, body)
+
+        data = response.read()
+        if response.status == 200:
+            self.cache.put(key, endpoint, path, response.headers.get("ETag"), data)
+        self.cache.count(endpoint, MISS)
+        return Response(response.status, response.headers, data)
@@ -1,12 +1,15 @@
-import os
 import re
-from datetime import timedelta
+import sys
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
 TIMEDELTA_REGEX = (r'((?P<days>-?\d+)d)?'
                    r'((?P<hours>-?\d+)h)?'
                    r'((?P<minutes>-?\d+)m)?')
 TIMEDELTA_PATTERN = re.compile(TIMEDELTA_REGEX, re.IGNORECASE)
 
+DEFAULT_CONCURRENCY = 8
+
 
 def duration_seconds(duration):
     duration = int(duration_delta(duration).total_seconds())
@@ -14,10 +17,64 @@ def duration_seconds(duration):
     return duration
 
 def duration_delta(duration):
-    match = TIMEDELTA_PATTERN.match(duration)
-    if not match:
+    match = TIMEDELTA_PATTERN.fullmatch(duration)
+    if not duration or not match:
         print("{} is not a valid duration, must be in format #d#h#m".format(duration))
-        os.exit(2)
+        sys.exit(2)
     parts = {k: int(v) for k, v in match.groupdict().items() if v}
     return timedelta(**parts)
 
+
+def run_all(func, items, concurrency = DEFAULT_CONCURRENCY):
+    """Call func on every item using a pool of at most `concurrency` threads.
+
+    Yields (item, result, error) tuples in the same order as `items`, as soon
+    as each one (and everything before it) has finished.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    items = list(items)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(func, item) for item in items]
+        try:
+            for item, future in zip(items, futures):
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+        finally:
+            # if the caller stopped early, don't start work nobody will see
+            for future in futures:
+                future.cancel()
+
+
+@lru_cache(maxsize=None)
+def local_timezone():
+    import tzlocal
+    return tzlocal.get_localzone()
+
+
+def timestamp(when):
+    """A datetime as pagerduty writes them, eg. 2019-02-01T10:00:00Z"""
+    return when.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_time(value):
+    """Parse a pagerduty timestamp (or a date given to pd) into a datetime in the local timezone.
+
+    Pagerduty always sends ISO-8601 (eg. 2019-02-01T10:00:00Z), which the
+    standard library handles far faster than maya; anything else still goes
+    through maya.
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        import maya
+        return maya.parse(value).datetime(to_timezone=str(local_timezone()))
+
+    zone = local_timezone()
+    if parsed.tzinfo is None:
+        # a date typed in without a timezone means the local one; older
+        # tzlocal gives pytz zones, which have to localize rather than replace
+        parsed = zone.localize(parsed) if hasattr(zone, 'localize') else parsed.replace(tzinfo=zone)
+    return parsed.astimezone(zone)
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+from .utils import DEFAULT_CONCURRENCY, timestamp
+
+ADDED = "added"
+CHANGED = "changed"
+REMOVED = "removed"
+
+
+class Watcher():
+    """Keeps a map of open incidents up to date with as little work as possible.
+
+    `start` lists the open incidents once. After that each `poll` only reads
+    the log entries written since the last one, which is a single request when
+    nothing happened, and re-fetches just the incidents they mention. Log
+    entries are re-read with some overlap so that clock skew between us and
+    pagerduty can't lose any, and ones already seen are skipped.
+    """
+
+    OVERLAP = timedelta(minutes = 1)
+
+    def __init__(self, client, user_id = None, triggered = False, concurrency = DEFAULT_CONCURRENCY):
+        self.client = client
+        self.user_id = user_id
+        self.statuses = ["triggered"] if triggered else ["triggered", "acknowledged"]
+        self.concurrency = concurrency
+        self.incidents = {}
+        self.seen = {}
+        self.since = None
+
+    def wanted(self, incident):
+        if incident.status not in self.statuses:
+            return False
+        if self.user_id is None:
+            return True
+        return self.user_id in incident.assignee_ids
+
+    @staticmethod
+    def state(incident):
+        return (incident.status, incident.assignee, incident.raw_summary)
+
+    def start(self):
+        """List the open incidents, returning them sorted by number."""
+        self.since = datetime.now(timezone.utc)
+        triggered = self.statuses == ["triggered"]
+        self.incidents = {
+            incident.raw_id: incident
+            for incident in self.client.list_incidents(user_id = self.user_id, triggered = triggered)
+        }
+        return sorted(self.incidents.values(), key = lambda incident: incident.id)
+
+    def changed_ids(self):
+        now = datetime.now(timezone.utc)
+        since = timestamp(self.since - Watcher.OVERLAP)
+        self.since = now
+
+        ids = set()
+        for entry in self.client.log_entries(since):
+            if entry.id in self.seen:
+                continue
+            self.seen[entry.id] = entry.created_at
+            ids.add(entry.incident.id)
+
+        # entries from before the overlap window can't come back
+        self.seen = {_id: created for _id, created in self.seen.items() if created >= since}
+        return ids
+
+    def poll(self):
+        """Catch up with pagerduty, returning a list of (change, incident)."""
+        ids = self.changed_ids()
+        if not ids:
+            return []
+
+        changes = []
+        for incident in self.client.incidents_by_id(sorted(ids), self.concurrency):
+            old = self.incidents.get(incident.raw_id)
+            if self.wanted(incident):
+                self.incidents[incident.raw_id] = incident
+                if old is None:
+                    changes.append((ADDED, incident))
+                elif Watcher.state(old) != Watcher.state(incident):
+                    changes.append((CHANGED, incident))
+            elif old is not None:
+                del self.incidents[incident.raw_id]
+                changes.append((REMOVED, incident))
+
+        changes.sort(key = lambda change: change[1].id)
+        return changes
@@ -1,4 +1,5 @@
 from lib import pd
+from lib.utils import run_all
 
 import requests
 
@@ -19,14 +20,19 @@ all_incidents = list(pd.pager.incidents.list(
 print("got all incidents: {}".format(len(all_incidents)))
 
 incidents = []
-for idx, i in enumerate(all_incidents):
+for idx, (i, alerts, error) in enumerate(run_all(lambda i: pd.alerts(i.id), all_incidents)):
     if idx % 20 == 0:
         print("at index {}".format(idx))
 
-    alerts = list(pd.pager.alerts.list(incident_id=i.id))
+    if error:
+        print("couldn't fetch alerts for incident {}: {}".format(i.id, error))
+        continue
+
     if len(alerts) != 1:
-        print("too many alerts on incident {}: {}".format(i.id, i.summary))
+        print("{} alerts on incident {}: {}".format(len(alerts), i.id, i.summary))
         print("\t{}".format(i.html_url))
+        if not alerts:
+            continue
 
     alert = alerts[0]
     if alert.alert_key.startswith("reboot-required:") or alert.alert_key.startswith("outdated-instance:"):